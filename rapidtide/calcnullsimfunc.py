@@ -216,7 +216,7 @@ def getNullDistributionDatax(
         print()
 
     # return the distribution data
-    numnonzero = len(np.where(corrlist != 0.0)[0])
+    numnonzero = np.count_nonzero(corrlist)
     print(
         "{:d} non-zero correlations out of {:d} ({:.2f}%)".format(
             numnonzero, len(corrlist), 100.0 * numnonzero / len(corrlist)
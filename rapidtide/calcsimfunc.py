@@ -29,6 +29,67 @@ import rapidtide.resample as tide_resample
 warnings.simplefilter(action="ignore", category=FutureWarning)
 LGR = logging.getLogger("GENERAL")
 
+# ----------------------------------------- Conditional imports ---------------------------------------
+try:
+    import cupy as cp
+except ImportError:
+    cupypresent = False
+else:
+    cupypresent = True
+
+
+def gpucorrelationavailable(theCorrelator):
+    """Check whether correlationpass_gpu can reproduce theCorrelator's similarity function.
+
+    Parameters
+    ----------
+    theCorrelator : Correlator
+        The similarity function calculator that would be used for the CPU pass
+
+    Returns
+    -------
+    available : bool
+        True if CuPy is installed and the similarity function is an unpadded crosscorrelation
+        with no baseline correction.
+    """
+    if not cupypresent:
+        return False
+    if not hasattr(theCorrelator, "corrweighting"):
+        # this is not a Correlator (e.g. mutual information)
+        return False
+    return (
+        theCorrelator.corrweighting in ["None", "phat", "liang", "eckart", "regressor"]
+        and theCorrelator.corrpadding == 0
+        and theCorrelator.baselinefilter is None
+    )
+
+
+def _gpugccproduct(testspectra, refspectrum, weighting, nfft, outlen, threshfrac=0.1):
+    # batched version of tide_corr.gccproduct followed by the inverse transform and amplitude
+    # rescaling done in tide_corr.convolve_weighted_fft - one row per voxel
+    product = testspectra * refspectrum[None, :]
+    thesimfuncs = cp.fft.irfft(product, n=nfft, axis=1)[:, :outlen]
+    if weighting == "None":
+        return thesimfuncs
+
+    theorigmax = cp.max(cp.absolute(thesimfuncs), axis=1, keepdims=True)
+    if weighting == "liang":
+        denom = cp.square(cp.absolute(testspectra) + cp.absolute(refspectrum)[None, :])
+    elif weighting == "eckart":
+        denom = cp.absolute(testspectra) * cp.absolute(refspectrum)[None, :]
+    elif weighting == "phat":
+        denom = cp.absolute(product)
+    else:
+        # regressor weighting depends only on the reference
+        denom = cp.broadcast_to(cp.square(cp.absolute(refspectrum))[None, :], product.shape)
+    thresh = cp.max(denom, axis=1, keepdims=True) * threshfrac
+    weightedproduct = cp.where(
+        (denom > thresh) & (thresh > 0.0), product / cp.where(denom > 0.0, denom, 1.0), 0.0
+    )
+    thesimfuncs = cp.fft.irfft(weightedproduct, n=nfft, axis=1)[:, :outlen]
+    thesimfuncs *= theorigmax / cp.max(cp.absolute(thesimfuncs), axis=1, keepdims=True)
+    return thesimfuncs
+
 
 def _procOneVoxelCorrelation(
     vox,
@@ -51,6 +112,116 @@ def _procOneVoxelCorrelation(
     return vox, np.mean(thetc), thexcorr_y, thexcorr_x, theglobalmax
 
 
+def _procOneVoxelPrep(
+    vox,
+    thetc,
+    theCorrelator,
+    fmri_x,
+    fmritc,
+    os_fmri_x,
+    oversampfactor=1,
+    interptype="univariate",
+    rt_floatset=np.float64,
+    rt_floattype="float64",
+):
+    # the CPU half of _procOneVoxelCorrelation - resample and prefilter, but don't correlate
+    if oversampfactor >= 1:
+        thetc[:] = tide_resample.doresample(fmri_x, fmritc, os_fmri_x, method=interptype)
+    else:
+        thetc[:] = fmritc
+
+    return vox, np.mean(thetc), theCorrelator.preptc(thetc)
+
+
+def _preppass(
+    fmridata,
+    theCorrelator,
+    fmri_x,
+    os_fmri_x,
+    preptcs,
+    meanval,
+    nprocs=1,
+    alwaysmultiproc=False,
+    oversampfactor=1,
+    interptype="univariate",
+    showprogressbar=True,
+    chunksize=1000,
+    rt_floatset=np.float64,
+    rt_floattype="float64",
+):
+    # fill preptcs with the resampled, prefiltered timecourse of every voxel
+    inputshape = np.shape(fmridata)
+    thetc = np.zeros(np.shape(os_fmri_x), dtype=rt_floattype)
+    if nprocs > 1 or alwaysmultiproc:
+        # define the consumer function here so it inherits most of the arguments
+        def prep_consumer(inQ, outQ):
+            while True:
+                try:
+                    # get a new message
+                    val = inQ.get()
+
+                    # this is the 'TERM' signal
+                    if val is None:
+                        break
+
+                    # process and send the data
+                    outQ.put(
+                        _procOneVoxelPrep(
+                            val,
+                            thetc,
+                            theCorrelator,
+                            fmri_x,
+                            fmridata[val, :],
+                            os_fmri_x,
+                            oversampfactor=oversampfactor,
+                            interptype=interptype,
+                            rt_floatset=rt_floatset,
+                            rt_floattype=rt_floattype,
+                        )
+                    )
+
+                except Exception as e:
+                    print("error!", e)
+                    break
+
+        data_out = tide_multiproc.run_multiproc(
+            prep_consumer,
+            inputshape,
+            None,
+            nprocs=nprocs,
+            showprogressbar=showprogressbar,
+            chunksize=chunksize,
+        )
+
+        # unpack the data
+        for voxel in data_out:
+            meanval[voxel[0]] = voxel[1]
+            preptcs[voxel[0], :] = voxel[2]
+        del data_out
+    else:
+        for vox in tqdm(
+            range(0, inputshape[0]),
+            desc="Voxel",
+            disable=(not showprogressbar),
+        ):
+            (
+                dummy,
+                meanval[vox],
+                preptcs[vox, :],
+            ) = _procOneVoxelPrep(
+                vox,
+                thetc,
+                theCorrelator,
+                fmri_x,
+                fmridata[vox, :],
+                os_fmri_x,
+                oversampfactor=oversampfactor,
+                interptype=interptype,
+                rt_floatset=rt_floatset,
+                rt_floattype=rt_floattype,
+            )
+
+
 def correlationpass(
     fmridata,
     referencetc,
@@ -67,6 +238,7 @@ def correlationpass(
     interptype="univariate",
     showprogressbar=True,
     chunksize=1000,
+    globalmaxout=None,
     rt_floatset=np.float64,
     rt_floattype="float64",
 ):
@@ -89,6 +261,7 @@ def correlationpass(
     interptype
     showprogressbar
     chunksize
+    globalmaxout - optional preallocated int array (one entry per voxel) to receive the global maximum indices
     rt_floatset
     rt_floattype
 
@@ -102,7 +275,10 @@ def correlationpass(
     inputshape = np.shape(fmridata)
     volumetotal = 0
     thetc = np.zeros(np.shape(os_fmri_x), dtype=rt_floattype)
-    theglobalmaxlist = []
+    if globalmaxout is None:
+        theglobalmaxlist = np.zeros(inputshape[0], dtype=np.int32)
+    else:
+        theglobalmaxlist = globalmaxout
     if nprocs > 1 or alwaysmultiproc:
         # define the consumer function here so it inherits most of the arguments
         def correlation_consumer(inQ, outQ):
@@ -150,7 +326,7 @@ def correlationpass(
             meanval[voxel[0]] = voxel[1]
             corrout[voxel[0], :] = voxel[2]
             thecorrscale = voxel[3]
-            theglobalmaxlist.append(voxel[4] + 0)
+            theglobalmaxlist[voxel[0]] = voxel[4]
             volumetotal += 1
         del data_out
     else:
@@ -177,7 +353,7 @@ def correlationpass(
                 rt_floatset=rt_floatset,
                 rt_floattype=rt_floattype,
             )
-            theglobalmaxlist.append(theglobalmax + 0)
+            theglobalmaxlist[vox] = theglobalmax
             volumetotal += 1
     LGR.info(f"\nSimilarity function calculated on {volumetotal} voxels")
 
@@ -189,3 +365,127 @@ def correlationpass(
         LGR.info("garbage collected")
 
     return volumetotal, theglobalmaxlist, thecorrscale
+
+
+def correlationpass_gpu(
+    fmridata,
+    referencetc,
+    theCorrelator,
+    fmri_x,
+    os_fmri_x,
+    lagmininpts,
+    lagmaxinpts,
+    corrout,
+    meanval,
+    nprocs=1,
+    alwaysmultiproc=False,
+    oversampfactor=1,
+    interptype="univariate",
+    showprogressbar=True,
+    chunksize=1000,
+    batchsize=1000,
+    globalmaxout=None,
+    preptcbuf=None,
+    rt_floatset=np.float64,
+    rt_floattype="float64",
+):
+    """Calculate the similarity function in every voxel, doing the crosscorrelations on the GPU.
+
+    Resampling and prefiltering are done on the CPU exactly as in correlationpass (multiprocessed
+    over nprocs); only the prepared timecourses are uploaded, in batches of batchsize voxels, and
+    correlated against the reference with a single batched FFT per batch.  Only valid when
+    gpucorrelationavailable() returns True for theCorrelator.
+
+    Parameters
+    ----------
+    fmridata
+    referencetc - the reference regressor, already oversampled
+    theCorrelator
+    fmri_x
+    os_fmri_x
+    lagmininpts
+    lagmaxinpts
+    corrout
+    meanval
+    nprocs
+    alwaysmultiproc
+    oversampfactor
+    interptype
+    showprogressbar
+    chunksize
+    batchsize - number of voxels sent to the GPU at once
+    globalmaxout - optional preallocated int array (one entry per voxel) to receive the global maximum indices
+    preptcbuf - optional preallocated (voxels, len(os_fmri_x)) array to hold the prepared timecourses,
+        so it can be reused from pass to pass
+    rt_floatset
+    rt_floattype
+
+    Returns
+    -------
+    volumetotal, theglobalmaxlist, thecorrscale
+    """
+    theCorrelator.setreftc(referencetc)
+    theCorrelator.setlimits(lagmininpts, lagmaxinpts)
+    dummy, thecorrscale, dummy = theCorrelator.getfunction(trim=True)
+
+    inputshape = np.shape(fmridata)
+    if globalmaxout is None:
+        theglobalmaxlist = np.zeros(inputshape[0], dtype=np.int32)
+    else:
+        theglobalmaxlist = globalmaxout
+
+    # the reference spectrum is the same for every voxel, so only compute it once.  Correlation
+    # is convolution with the time reversed reference, as in tide_corr.fastcorrelate.
+    tclen = len(theCorrelator.prepreftc)
+    simfunclen = 2 * tclen - 1
+    simfuncorigin = simfunclen // 2 + 1
+    trimstart = simfuncorigin - lagmininpts
+    trimend = simfuncorigin + lagmaxinpts
+    nfft = 1 << (simfunclen - 1).bit_length()
+    refspectrum = cp.fft.rfft(cp.asarray(theCorrelator.prepreftc[::-1]), n=nfft)
+
+    if preptcbuf is None:
+        preptcs = np.zeros((inputshape[0], tclen), dtype=rt_floattype)
+    else:
+        preptcs = preptcbuf
+    _preppass(
+        fmridata,
+        theCorrelator,
+        fmri_x,
+        os_fmri_x,
+        preptcs,
+        meanval,
+        nprocs=nprocs,
+        alwaysmultiproc=alwaysmultiproc,
+        oversampfactor=oversampfactor,
+        interptype=interptype,
+        showprogressbar=showprogressbar,
+        chunksize=chunksize,
+        rt_floatset=rt_floatset,
+        rt_floattype=rt_floattype,
+    )
+
+    volumetotal = 0
+    for batchstart in tqdm(
+        range(0, inputshape[0], batchsize),
+        desc="Voxel batch",
+        disable=(not showprogressbar),
+    ):
+        batchend = min(batchstart + batchsize, inputshape[0])
+        thesimfuncs = _gpugccproduct(
+            cp.fft.rfft(cp.asarray(preptcs[batchstart:batchend, :]), n=nfft, axis=1),
+            refspectrum,
+            theCorrelator.corrweighting,
+            nfft,
+            simfunclen,
+        )
+        theglobalmaxlist[batchstart:batchend] = cp.asnumpy(cp.argmax(thesimfuncs, axis=1))
+        corrout[batchstart:batchend, :] = cp.asnumpy(thesimfuncs[:, trimstart:trimend])
+        volumetotal += batchend - batchstart
+        del thesimfuncs
+    LGR.info(f"\nSimilarity function calculated on {volumetotal} voxels")
+
+    # release the FFT workspace back to the pool
+    cp.get_default_memory_pool().free_all_blocks()
+
+    return volumetotal, theglobalmaxlist, thecorrscale
@@ -21,7 +21,9 @@ package.
 
 """
 
+import concurrent.futures
 import sys
+import threading
 import warnings
 
 import matplotlib.pyplot as plt
@@ -235,6 +237,69 @@ def ssmooth(xsize, ysize, zsize, sigma, inputdata):
     return ndimage.gaussian_filter(inputdata, [sigma / xsize, sigma / ysize, sigma / zsize])
 
 
+def getneighborhoodindices(theshape, thevoxels):
+    r"""Find the linear indices of the 3x3x...x3 neighborhood around each of a set of voxels
+
+    Parameters
+    ----------
+    theshape : tuple of ints
+        The shape of the spatial array
+        :param theshape:
+
+    thevoxels : 1D int array
+        Linear indices (into the flattened array) of the voxels of interest
+        :param thevoxels:
+
+    Returns
+    -------
+    neighborindices : 2D int array
+        Array of shape (len(thevoxels), 3**len(theshape)) with the linear index of each neighbor.
+        Neighbors that fall off the edge of the array are replaced by the nearest edge voxel, which
+        matches the "reflect" boundary mode of ndimage.median_filter for a kernel of size 3.
+
+    """
+    theshape = np.atleast_1d(theshape)
+    thecoords = np.unravel_index(thevoxels, theshape)
+    theoffsets = np.indices((3,) * len(theshape)).reshape(len(theshape), -1).T - 1
+    if np.prod(theshape) < np.iinfo(np.int32).max:
+        indextype = np.int32
+    else:
+        indextype = np.int64
+    neighborindices = np.zeros((len(thevoxels), len(theoffsets)), dtype=indextype)
+    for i, theoffset in enumerate(theoffsets):
+        neighborindices[:, i] = np.ravel_multi_index(
+            tuple(
+                np.clip(thecoords[dim] + theoffset[dim], 0, theshape[dim] - 1)
+                for dim in range(len(theshape))
+            ),
+            theshape,
+        )
+    return neighborindices
+
+
+def neighborhoodmedian(inputdata, neighborindices):
+    r"""Applies a size 3 median filter, evaluated only at the voxels described by neighborindices
+
+    Parameters
+    ----------
+    inputdata : numeric array
+        The spatial data to filter (any shape - it is flattened)
+        :param inputdata:
+
+    neighborindices : 2D int array
+        The neighborhood index table returned by getneighborhoodindices
+        :param neighborindices:
+
+    Returns
+    -------
+    filtereddata : 1D array
+        The median of the neighborhood of each voxel, equal to
+        ndimage.median_filter(inputdata, 3).reshape(-1)[thevoxels]
+
+    """
+    return np.median(inputdata.reshape(-1)[neighborindices], axis=1)
+
+
 # - butterworth filters
 # @conditionaljit()
 def dolpfiltfilt(
@@ -832,6 +897,7 @@ def dolptransfuncfilt(
     avlen=20,
     cyclic=False,
     padtype="reflect",
+    fftplans=None,
     debug=False,
 ):
     r"""Performs an FFT filter with a gaussian lowpass transfer
@@ -859,6 +925,10 @@ def dolptransfuncfilt(
         If True, pad by wrapping the data in a cyclic manner rather than reflecting at the ends
         :param cyclic:
 
+    fftplans : dict, optional
+        Cache of FFT plans to reuse from call to call (see NoncausalFilter).  Default is None.
+        :param fftplans:
+
     debug : boolean, optional
         When True, internal states of the function will be printed to help debugging.
         :param debug:
@@ -871,7 +941,7 @@ def dolptransfuncfilt(
     padinputdata = padvec(
         inputdata, padlen=padlen, avlen=avlen, cyclic=cyclic, padtype=padtype, debug=debug
     )
-    inputdata_trans = fftpack.fft(padinputdata)
+    inputdata_trans = _cachedfft(padinputdata, fftplans)
     transferfunc = getlptransfunc(
         Fs, padinputdata, upperpass=upperpass, upperstop=upperstop, type=type
     )
@@ -886,7 +956,7 @@ def dolptransfuncfilt(
         plt.plot(freqaxis, transferfunc)
         plt.show()
     inputdata_trans *= transferfunc
-    return unpadvec(fftpack.ifft(inputdata_trans).real, padlen=padlen)
+    return unpadvec(_cachedfft(inputdata_trans, fftplans, inverse=True).real, padlen=padlen)
 
 
 # @conditionaljit()
@@ -900,6 +970,7 @@ def dohptransfuncfilt(
     avlen=20,
     cyclic=False,
     padtype="reflect",
+    fftplans=None,
     debug=False,
 ):
     r"""Performs an FFT filter with a trapezoidal highpass transfer
@@ -931,6 +1002,10 @@ def dohptransfuncfilt(
         If True, pad by wrapping the data in a cyclic manner rather than reflecting at the ends
         :param cyclic:
 
+    fftplans : dict, optional
+        Cache of FFT plans to reuse from call to call (see NoncausalFilter).  Default is None.
+        :param fftplans:
+
     debug : boolean, optional
         When True, internal states of the function will be printed to help debugging.
         :param debug:
@@ -945,7 +1020,7 @@ def dohptransfuncfilt(
     padinputdata = padvec(
         inputdata, padlen=padlen, avlen=avlen, cyclic=cyclic, padtype=padtype, debug=debug
     )
-    inputdata_trans = fftpack.fft(padinputdata)
+    inputdata_trans = _cachedfft(padinputdata, fftplans)
     transferfunc = getlptransfunc(
         Fs, padinputdata, upperpass=lowerstop, upperstop=lowerpass, type=type
     )
@@ -960,7 +1035,7 @@ def dohptransfuncfilt(
         plt.plot(freqaxis, transferfunc)
         plt.show()
     inputdata_trans *= 1.0 - transferfunc
-    return unpadvec(fftpack.ifft(inputdata_trans).real, padlen=padlen)
+    return unpadvec(_cachedfft(inputdata_trans, fftplans, inverse=True).real, padlen=padlen)
 
 
 # @conditionaljit()
@@ -976,6 +1051,7 @@ def dobptransfuncfilt(
     avlen=20,
     cyclic=False,
     padtype="reflect",
+    fftplans=None,
     debug=False,
 ):
     r"""Performs an FFT filter with a trapezoidal highpass transfer
@@ -1007,6 +1083,10 @@ def dobptransfuncfilt(
         If True, pad by wrapping the data in a cyclic manner rather than reflecting at the ends
         :param cyclic:
 
+    fftplans : dict, optional
+        Cache of FFT plans to reuse from call to call (see NoncausalFilter).  Default is None.
+        :param fftplans:
+
     debug : boolean, optional
         When True, internal states of the function will be printed to help debugging.
         :param debug:
@@ -1021,7 +1101,7 @@ def dobptransfuncfilt(
     padinputdata = padvec(
         inputdata, padlen=padlen, avlen=avlen, cyclic=cyclic, padtype=padtype, debug=debug
     )
-    inputdata_trans = fftpack.fft(padinputdata)
+    inputdata_trans = _cachedfft(padinputdata, fftplans)
     transferfunc = getlptransfunc(
         Fs,
         padinputdata,
@@ -1045,7 +1125,7 @@ def dobptransfuncfilt(
         plt.plot(freqaxis, transferfunc)
         plt.show()
     inputdata_trans *= transferfunc
-    return unpadvec(fftpack.ifft(inputdata_trans).real, padlen=padlen)
+    return unpadvec(_cachedfft(inputdata_trans, fftplans, inverse=True).real, padlen=padlen)
 
 
 # @conditionaljit()
@@ -1485,6 +1565,7 @@ def arb_pass(
     avlen=20,
     cyclic=False,
     padtype="reflect",
+    fftplans=None,
     debug=False,
 ):
     r"""Filters an input waveform over a specified range.  By default it is a trapezoidal
@@ -1529,6 +1610,10 @@ def arb_pass(
         If True, pad by wrapping the data in a cyclic manner rather than reflecting at the ends
         :param cyclic:
 
+    fftplans : dict, optional
+        Cache of FFT plans to reuse from call to call (see NoncausalFilter).  Default is None.
+        :param fftplans:
+
     debug : boolean, optional
         When True, internal states of the function will be printed to help debugging.
         :param debug:
@@ -1565,6 +1650,7 @@ def arb_pass(
                 avlen=avlen,
                 cyclic=cyclic,
                 padtype=padtype,
+                fftplans=fftplans,
                 debug=debug,
             )
     elif (upperpass >= Fs / 2.0) or (upperpass <= 0.0):
@@ -1592,6 +1678,7 @@ def arb_pass(
                 avlen=avlen,
                 cyclic=cyclic,
                 padtype=padtype,
+                fftplans=fftplans,
                 debug=debug,
             )
     else:
@@ -1631,6 +1718,7 @@ def arb_pass(
                 avlen=avlen,
                 cyclic=cyclic,
                 padtype=padtype,
+                fftplans=fftplans,
                 debug=debug,
             )
 
@@ -1812,9 +1900,31 @@ class NoncausalFilter:
         self.cyclic = cyclic
         self.padtype = padtype
         self.debug = debug
+        # FFT plans for the lengths this filter has seen, kept per thread (see _getfftplans)
+        self._fftplanstore = threading.local()
 
         self.settype(self.filtertype)
 
+    def __getstate__(self):
+        # FFTW plans can't be pickled - the copy just builds its own
+        thestate = self.__dict__.copy()
+        del thestate["_fftplanstore"]
+        return thestate
+
+    def __setstate__(self, thestate):
+        self.__dict__.update(thestate)
+        self._fftplanstore = threading.local()
+
+    def _getfftplans(self):
+        # the filter is reapplied to same length data every pass, so keep the FFT plans on the
+        # filter rather than replanning each time.  A plan owns its work arrays, so each thread
+        # (see applybatch) gets its own set.
+        try:
+            return self._fftplanstore.plans
+        except AttributeError:
+            self._fftplanstore.plans = {}
+            return self._fftplanstore.plans
+
     def settype(self, thetype):
         self.filtertype = thetype
         if self.filtertype == "vlf" or self.filtertype == "vlf_stop":
@@ -2082,6 +2192,7 @@ class NoncausalFilter:
                 padlen=padlen,
                 cyclic=self.cyclic,
                 padtype=self.padtype,
+                fftplans=self._getfftplans(),
                 debug=self.debug,
             )
         elif (
@@ -2110,6 +2221,7 @@ class NoncausalFilter:
                 avlen=avlen,
                 cyclic=self.cyclic,
                 padtype=self.padtype,
+                fftplans=self._getfftplans(),
                 debug=self.debug,
             )
         elif (
@@ -2138,6 +2250,7 @@ class NoncausalFilter:
                 avlen=avlen,
                 cyclic=self.cyclic,
                 padtype=self.padtype,
+                fftplans=self._getfftplans(),
                 debug=self.debug,
             )
         elif self.filtertype == "arb":
@@ -2154,6 +2267,7 @@ class NoncausalFilter:
                 avlen=avlen,
                 cyclic=self.cyclic,
                 padtype=self.padtype,
+                fftplans=self._getfftplans(),
                 debug=self.debug,
             )
         elif self.filtertype == "arb_stop":
@@ -2170,14 +2284,111 @@ class NoncausalFilter:
                 avlen=avlen,
                 cyclic=self.cyclic,
                 padtype=self.padtype,
+                fftplans=self._getfftplans(),
                 debug=self.debug,
             )
         else:
             print(f"bad filter type: {self.filtertype}")
             sys.exit()
 
+    def applybatch(self, Fs, data, out=None, blocksize=10000, maxmatrixlen=1024, nthreads=1):
+        r"""Apply the filter to every row of a 2D array.
+
+        Every filter type (including the end padding) is linear, so for a given timecourse
+        length the filter is just a matrix.  That matrix is built once by filtering unit
+        impulses, and then applied to blocks of rows with a single matrix multiply.  For very
+        long timecourses, where the matrix multiply would cost more than filtering each row,
+        the rows are filtered one at a time, split across nthreads threads.
+
+        Parameters
+        ----------
+        Fs : float
+            Sample frequency
+        data : 2D float array
+            The data to filter, with time along the last axis
+        out : 2D float array, optional
+            Where to put the filtered data.  May be data itself.  If None, a new array is
+            allocated.
+        blocksize : int, optional
+            Number of rows to filter at once.  Default is 10000.
+        maxmatrixlen : int, optional
+            The longest timecourse to use the matrix method for.  Default is 1024.
+        nthreads : int, optional
+            Number of threads to use when filtering row by row.  The FFTs and the butterworth
+            filters release the GIL, so rows can be filtered in parallel.  Default is 1.
+
+        Returns
+        -------
+        filtereddata : 2D float array
+            The filtered data
+        """
+        numrows, numpoints = data.shape
+        if out is None:
+            out = np.zeros_like(data)
+        if self.filtertype == "None":
+            out[:, :] = data
+            return out
+        if numpoints > maxmatrixlen or numrows <= numpoints:
+
+            def filterrows(startrow, endrow):
+                for i in range(startrow, endrow):
+                    out[i, :] = self.apply(Fs, data[i, :] + 0.0)
+
+            if nthreads > 1 and numrows > 1:
+                rowbounds = np.linspace(0, numrows, min(nthreads, numrows) + 1).astype(int)
+                with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=len(rowbounds) - 1
+                ) as filterpool:
+                    thefutures = [
+                        filterpool.submit(filterrows, rowbounds[i], rowbounds[i + 1])
+                        for i in range(len(rowbounds) - 1)
+                    ]
+                    for thefuture in thefutures:
+                        thefuture.result()
+            else:
+                filterrows(0, numrows)
+            return out
+
+        # row i of filtermatrix is the response to an impulse at time i, so filtered = data @ it
+        filtermatrix = np.zeros((numpoints, numpoints), dtype=np.float64)
+        impulse = np.zeros(numpoints, dtype=np.float64)
+        for i in range(numpoints):
+            impulse[i] = 1.0
+            filtermatrix[i, :] = self.apply(Fs, impulse)
+            impulse[i] = 0.0
+        filtermatrix = filtermatrix.astype(data.dtype, copy=False)
+        for startrow in range(0, numrows, blocksize):
+            endrow = min(startrow + blocksize, numrows)
+            out[startrow:endrow, :] = data[startrow:endrow, :] @ filtermatrix
+        return out
+
 
 # --------------------------- FFT helper functions ---------------------------------------------
+MAXFFTPLANS = 8
+
+
+def _cachedfft(inputdata, fftplans=None, inverse=False):
+    # fft (or ifft) of inputdata, reusing an FFTW plan from fftplans (a dict) if pyfftw is present
+    if fftplans is None or not pyfftwpresent:
+        if inverse:
+            return fftpack.ifft(inputdata)
+        return fftpack.fft(inputdata)
+    thedtype = np.result_type(inputdata.dtype, np.complex64)
+    thekey = (len(inputdata), thedtype.str, inverse)
+    theplan = fftplans.pop(thekey, None)
+    if theplan is None:
+        if len(fftplans) >= MAXFFTPLANS:
+            # drop the least recently used plan
+            del fftplans[next(iter(fftplans))]
+        if inverse:
+            theplan = pyfftw.builders.ifft(pyfftw.empty_aligned(len(inputdata), dtype=thedtype))
+        else:
+            theplan = pyfftw.builders.fft(pyfftw.empty_aligned(len(inputdata), dtype=thedtype))
+    fftplans[thekey] = theplan
+    # the plan owns its output array, so hand back a copy
+    return theplan(inputdata).copy()
+
+
 def polarfft(inputdata):
     complexxform = fftpack.fft(inputdata)
     return np.abs(complexxform), np.angle(complexxform)
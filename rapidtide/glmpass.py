@@ -24,6 +24,98 @@ import rapidtide.fit as tide_fit
 import rapidtide.miscmath as tide_math
 import rapidtide.multiproc as tide_multiproc
 
+# ----------------------------------------- Conditional imports ---------------------------------------
+try:
+    from numba import jit
+except ImportError:
+    donotusenumba = True
+else:
+    donotusenumba = False
+
+
+def conditionaljit():
+    def resdec(f):
+        if donotusenumba:
+            return f
+        return jit(f, nopython=True)
+
+    return resdec
+
+
+def disablenumba():
+    global donotusenumba
+    donotusenumba = True
+
+
+@conditionaljit()
+def _glmkernel(
+    themask,
+    theevs,
+    fmri_data,
+    meanvalue,
+    rvalue,
+    r2value,
+    fitcoeff,
+    fitNorm,
+    datatoremove,
+    filtereddata,
+    savedatatoremove,
+):
+    # ordinary least squares with an intercept for every voxel in themask, matching
+    # _procOneGLMItem.  theevs is (voxels, timepoints, evs), fitcoeff and fitNorm are (voxels, evs)
+    numevs = theevs.shape[2]
+    for vox in range(fmri_data.shape[0]):
+        if themask[vox] > 0:
+            thedata = fmri_data[vox, :].astype(np.float64)
+            ymean = np.mean(thedata)
+            yc = thedata - ymean
+            xmeans = np.zeros(numevs)
+            xc = np.empty((thedata.shape[0], numevs))
+            for j in range(numevs):
+                xmeans[j] = np.mean(theevs[vox, :, j])
+                xc[:, j] = theevs[vox, :, j] - xmeans[j]
+            if numevs == 1:
+                xnorm = np.sum(xc[:, 0] * xc[:, 0])
+                thecoffs = np.zeros(1)
+                if xnorm > 0.0:
+                    thecoffs[0] = np.sum(xc[:, 0] * yc) / xnorm
+            else:
+                thecoffs = np.linalg.lstsq(xc, yc)[0]
+            theintercept = ymean - np.sum(xmeans * thecoffs)
+
+            # the R2 calculation follows sklearn's score
+            thefit = np.zeros(thedata.shape[0])
+            for j in range(numevs):
+                thefit += thecoffs[j] * theevs[vox, :, j]
+            ssres = np.sum((yc - (thefit - np.mean(thefit))) ** 2)
+            sstot = np.sum(yc * yc)
+            if sstot > 0.0:
+                R2 = 1.0 - ssres / sstot
+            elif ssres == 0.0:
+                R2 = 1.0
+            else:
+                R2 = 0.0
+            if np.all(thecoffs == 0.0):
+                R2 = 0.0
+            if thecoffs[0] < 0.0:
+                coeffsign = -1.0
+            else:
+                coeffsign = 1.0
+
+            meanvalue[vox] = theintercept
+            rvalue[vox] = coeffsign * np.sqrt(R2)
+            r2value[vox] = R2
+            for j in range(numevs):
+                fitcoeff[vox, j] = thecoffs[j]
+                # nopython mode raises on float division by zero, so match numpy's inf/nan here
+                if theintercept != 0.0:
+                    fitNorm[vox, j] = thecoffs[j] / theintercept
+                else:
+                    fitNorm[vox, j] = thecoffs[j] * np.inf
+            if savedatatoremove:
+                datatoremove[vox, :] = thefit
+            filtereddata[vox, :] = thedata - thefit
+
 
 def _procOneGLMItem(vox, theevs, thedata, rt_floatset=np.float64, rt_floattype="float64"):
     # NOTE: if theevs is 2D, dimension 0 is number of points, dimension 1 is number of evs
@@ -206,7 +298,8 @@ def glmpass(
                     else:
                         fitcoeff[voxel[0]] = voxel[4]
                         fitNorm[voxel[0]] = voxel[5]
-                    datatoremove[voxel[0], :] = voxel[6]
+                    if datatoremove is not None:
+                        datatoremove[voxel[0], :] = voxel[6]
                     filtereddata[voxel[0], :] = voxel[7]
                     itemstotal += 1
         else:
@@ -226,11 +319,47 @@ def glmpass(
                     else:
                         fitcoeff[timepoint[0]] = timepoint[4]
                         fitNorm[timepoint[0]] = timepoint[5]
-                    datatoremove[:, timepoint[0]] = timepoint[6]
+                    if datatoremove is not None:
+                        datatoremove[:, timepoint[0]] = timepoint[6]
                     filtereddata[:, timepoint[0]] = timepoint[7]
                     itemstotal += 1
 
         del data_out
+    elif (
+        procbyvoxel
+        and not confoundglm
+        and not donotusenumba
+        and np.ndim(fitcoeff) == theevs.ndim - 1
+        and np.ndim(fitNorm) == theevs.ndim - 1
+    ):
+        # in a single process, fit all the voxels in one compiled loop rather than calling
+        # _procOneGLMItem for each voxel
+        if themask is None:
+            themask = np.ones(numprocitems, dtype=np.int64)
+        if theevs.ndim > 2:
+            fitevs = theevs
+            fitcoeffs = fitcoeff
+            fitNorms = fitNorm
+        else:
+            fitevs = theevs[:, :, None]
+            fitcoeffs = fitcoeff[:, None]
+            fitNorms = fitNorm[:, None]
+        if showprogressbar:
+            print(f"fitting {numprocitems} voxels")
+        _glmkernel(
+            themask[:numprocitems],
+            fitevs[:numprocitems],
+            fmri_data[:numprocitems],
+            meanvalue,
+            rvalue,
+            r2value,
+            fitcoeffs,
+            fitNorms,
+            filtereddata if datatoremove is None else datatoremove,
+            filtereddata,
+            datatoremove is not None,
+        )
+        itemstotal = int(np.sum(themask[:numprocitems] > 0))
     else:
         itemstotal = 0
         if procbyvoxel:
@@ -267,7 +396,7 @@ def glmpass(
                             r2value[vox],
                             fitcoeff[vox],
                             fitNorm[vox],
-                            datatoremove[vox, :],
+                            thedatatoremove,
                             filtereddata[vox, :],
                         ) = _procOneGLMItem(
                             vox,
@@ -276,6 +405,8 @@ def glmpass(
                             rt_floatset=rt_floatset,
                             rt_floattype=rt_floattype,
                         )
+                        if datatoremove is not None:
+                            datatoremove[vox, :] = thedatatoremove
                     itemstotal += 1
         else:
             for timepoint in tqdm(
@@ -311,7 +442,7 @@ def glmpass(
                             r2value[timepoint],
                             fitcoeff[timepoint],
                             fitNorm[timepoint],
-                            datatoremove[:, timepoint],
+                            thedatatoremove,
                             filtereddata[:, timepoint],
                         ) = _procOneGLMItem(
                             timepoint,
@@ -320,6 +451,8 @@ def glmpass(
                             rt_floatset=rt_floatset,
                             rt_floattype=rt_floattype,
                         )
+                        if datatoremove is not None:
+                            datatoremove[:, timepoint] = thedatatoremove
                     itemstotal += 1
         if showprogressbar:
             print()
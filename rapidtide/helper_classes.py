@@ -281,6 +281,8 @@ class MutualInformationator(SimilarityFunctionator):
         self.bins = bins
 
     def setreftc(self, reftc, offset=0.0):
+        # this is a copy, not a view - the null distribution calculation reads reftc directly, so
+        # it must not change if the caller later modifies the array it passed in
         self.reftc = reftc + 0.0
         self.prepreftc = self.preptc(self.reftc, isreftc=True)
 
@@ -418,6 +420,8 @@ class Correlator(SimilarityFunctionator):
         self.lagmaxinpts = lagmaxinpts
 
     def setreftc(self, reftc, offset=0.0):
+        # this is a copy, not a view - the null distribution calculation reads reftc directly, so
+        # it must not change if the caller later modifies the array it passed in
         self.reftc = reftc + 0.0
         self.prepreftc = self.preptc(self.reftc, isreftc=True)
         self.similarityfunclen = len(self.reftc) * 2 - 1
@@ -479,6 +483,7 @@ class Correlator(SimilarityFunctionator):
 class Coherer:
     reftc = None
     prepreftc = None
+    refpsd = None
     testtc = None
     preptesttc = None
     freqaxis = None
@@ -553,9 +558,15 @@ class Coherer:
         )
 
     def setreftc(self, reftc):
-        self.reftc = reftc + 0.0
+        # keep a read-only view of the reference rather than a copy; it is only used for length
+        # checks, and the math uses prepreftc
+        self.reftc = np.asarray(reftc).view()
+        self.reftc.flags.writeable = False
         self.prepreftc = self.preptc(self.reftc)
 
+        # the reference power spectrum is the same for every test timecourse, so compute it once
+        self.freqaxis, self.refpsd = sp.signal.welch(self.prepreftc, fs=self.Fs)
+
         # get frequency axis, etc
         self.freqaxis, self.thecoherence = sp.signal.coherence(
             self.prepreftc, self.prepreftc, fs=self.Fs
@@ -601,9 +612,10 @@ class Coherer:
             plt.show()
 
         if not alt:
-            self.freqaxis, self.thecoherence = sp.signal.coherence(
-                self.prepreftc, self.preptesttc, fs=self.Fs
-            )
+            # same as sp.signal.coherence, but reusing the precomputed reference spectrum
+            dummy, thetestpsd = sp.signal.welch(self.preptesttc, fs=self.Fs)
+            self.freqaxis, thecsd = sp.signal.csd(self.prepreftc, self.preptesttc, fs=self.Fs)
+            self.thecoherence = np.abs(thecsd) ** 2 / self.refpsd / thetestpsd
         else:
             self.freqaxis, self.thecsdxy = sp.signal.csd(
                 10000.0 * self.prepreftc,
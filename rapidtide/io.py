@@ -16,6 +16,7 @@
 #   limitations under the License.
 #
 #
+import concurrent.futures
 import copy
 import json
 import operator as op
@@ -168,7 +169,7 @@ def dumparraytonifti(thearray, filename):
     savetonifti(thearray, outputheader, filename)
 
 
-def savetonifti(thearray, theheader, thename, debug=False):
+def savetonifti(thearray, theheader, thename, compresslevel=None, debug=False):
     r"""Save a data array out to a nifti file
 
     Parameters
@@ -179,6 +180,10 @@ def savetonifti(thearray, theheader, thename, debug=False):
         A valid nifti header
     thename : str
         The name of the nifti file to save
+    compresslevel : int, optional
+        The gzip compression level (0-9) for .nii.gz files.  0 stores the data uncompressed
+        in a valid gzip stream, which is much faster to write for large 4D files.  If None,
+        use the nibabel default.
 
     Returns
     -------
@@ -187,6 +192,9 @@ def savetonifti(thearray, theheader, thename, debug=False):
     outputaffine = theheader.get_best_affine()
     qaffine, qcode = theheader.get_qform(coded=True)
     saffine, scode = theheader.get_sform(coded=True)
+    if thearray.dtype == np.bool_:
+        # NIfTI has no boolean type - write masks as uint8 (a view, so no copy is made)
+        thearray = thearray.view(np.uint8)
     thedtype = thearray.dtype
     if thedtype == np.uint8:
         thedatatypecode = 2
@@ -240,16 +248,30 @@ def savetonifti(thearray, theheader, thename, debug=False):
         targetdatatype = theheader["datatype"]
         print(f"\ttargetdatatype={targetdatatype}")
 
+    # the header datatype already matches the array, so hand the array over as is rather than
+    # making a full copy of it with astype
     if theheader["magic"] == "n+2":
-        output_nifti = nib.Nifti2Image(thearray.astype(thedtype), outputaffine, header=theheader)
+        output_nifti = nib.Nifti2Image(thearray, outputaffine, header=theheader)
         suffix = ".nii"
     else:
-        output_nifti = nib.Nifti1Image(thearray.astype(thedtype), outputaffine, header=theheader)
+        output_nifti = nib.Nifti1Image(thearray, outputaffine, header=theheader)
         suffix = ".nii.gz"
     output_nifti.set_qform(qaffine, code=int(qcode))
     output_nifti.set_sform(saffine, code=int(scode))
 
-    output_nifti.to_filename(thename + suffix)
+    if compresslevel is None or suffix != ".nii.gz":
+        output_nifti.to_filename(thename + suffix)
+    else:
+        with nib.openers.ImageOpener(
+            thename + suffix, "wb", compresslevel=compresslevel
+        ) as thefileobj:
+            output_nifti.to_file_map(
+                {
+                    "image": nib.fileholders.FileHolder(
+                        filename=thename + suffix, fileobj=thefileobj
+                    )
+                }
+            )
     output_nifti = None
 
 
@@ -301,16 +323,19 @@ def populatemap(
     internalspaceshape,
     validvoxels,
     outmaparray,
+    zerofill=True,
     debug=False,
 ):
     if len(outmaparray.shape) == 1:
-        outmaparray[:] = 0.0
+        if zerofill:
+            outmaparray[:] = 0.0
         if validvoxels is not None:
             outmaparray[validvoxels] = themap[:].reshape((np.shape(validvoxels)[0]))
         else:
             outmaparray = themap[:].reshape((internalspaceshape))
     else:
-        outmaparray[:, :] = 0.0
+        if zerofill:
+            outmaparray[:, :] = 0.0
         if validvoxels is not None:
             outmaparray[validvoxels, :] = themap[:, :].reshape(
                 (np.shape(validvoxels)[0], outmaparray.shape[1])
@@ -334,30 +359,77 @@ def savemaplist(
     rt_floattype="float64",
     cifti_hdr=None,
     savejson=True,
+    nthreads=1,
+    compresslevel=None,
     debug=False,
 ):
-    outmaparray, internalspaceshape = makedestarray(
+    if nthreads > 1 and len(maplist) > 1:
+        # write the maps concurrently - most of the time goes to gzip, which releases the GIL.
+        # Each map gets its own output array and header, since savetonifti modifies the header.
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(nthreads, len(maplist))
+        ) as savepool:
+            thefutures = [
+                savepool.submit(
+                    savemaplist,
+                    outputname,
+                    [themapentry],
+                    validvoxels,
+                    destshape,
+                    None if theheader is None else theheader.copy(),
+                    bidsbasedict,
+                    textio=textio,
+                    fileiscifti=fileiscifti,
+                    rt_floattype=rt_floattype,
+                    cifti_hdr=cifti_hdr,
+                    savejson=savejson,
+                    compresslevel=compresslevel,
+                    debug=debug,
+                )
+                for themapentry in maplist
+            ]
+            for thefuture in thefutures:
+                thefuture.result()
+        return
+
+    destarray, internalspaceshape = makedestarray(
         destshape,
         textio=textio,
         fileiscifti=fileiscifti,
         rt_floattype=rt_floattype,
     )
-    for themap, mapsuffix, maptype, theunit, thedescription in maplist:
+    # a map entry can carry an optional sixth element that overrides validvoxels for that map
+    filledvoxels = None
+    for themapentry in maplist:
+        themap, mapsuffix, maptype, theunit, thedescription = themapentry[:5]
+        if len(themapentry) > 5:
+            thevalidvoxels = themapentry[5]
+        else:
+            thevalidvoxels = validvoxels
         # copy the data into the output array, remapping if warranted
         if debug:
-            if validvoxels is None:
+            if thevalidvoxels is None:
                 print(f"savemaplist: saving {mapsuffix}  to {destshape}")
             else:
                 print(
-                    f"savemaplist: saving {mapsuffix}  to {destshape} from {np.shape(validvoxels)[0]} valid voxels"
+                    f"savemaplist: saving {mapsuffix}  to {destshape} from {np.shape(thevalidvoxels)[0]} valid voxels"
                 )
+        # destarray starts out zeroed, and maps that fill the same voxels overwrite each other
+        # completely, so it only needs to be cleared when the voxel set changes
         outmaparray = populatemap(
             themap,
             internalspaceshape,
-            validvoxels,
-            outmaparray,
+            thevalidvoxels,
+            destarray,
+            zerofill=(
+                thevalidvoxels is not None
+                and filledvoxels is not None
+                and thevalidvoxels is not filledvoxels
+            ),
             debug=False,
         )
+        if thevalidvoxels is not None:
+            filledvoxels = thevalidvoxels
 
         # actually write out the data
         bidsdict = bidsbasedict.copy()
@@ -375,7 +447,12 @@ def savemaplist(
             if savejson:
                 writedicttojson(bidsdict, savename + ".json")
             if not fileiscifti:
-                savetonifti(outmaparray.reshape(destshape), theheader, savename)
+                savetonifti(
+                    outmaparray.reshape(destshape),
+                    theheader,
+                    savename,
+                    compresslevel=compresslevel,
+                )
             else:
                 isseries = len(outmaparray.shape) != 1
                 if isseries:
@@ -389,19 +389,27 @@ def ppnormalize(vector):
         return demeaned
 
 
-def imagevariance(thedata, thefilter, samplefreq, meannorm=True, debug=False):
+def imagevariance(
+    thedata, thefilter, samplefreq, meannorm=True, out=None, blocksize=10000, debug=False
+):
     if debug:
         print(f"IMAGEVARIANCE: {thedata.shape}, {thefilter}, {samplefreq}")
-    filteredim = thedata * 0.0
-    if thefilter is not None:
-        for thevoxel in range(thedata.shape[0]):
-            filteredim[thevoxel, :] = thefilter.apply(samplefreq, thedata[thevoxel, :])
-    else:
-        filteredim = thedata
+    if out is None:
+        out = np.empty(thedata.shape[0], dtype=thedata.dtype)
+
+    # filter a block of voxels at a time, so we never hold a filtered copy of the whole dataset
+    for startvox in range(0, thedata.shape[0], blocksize):
+        endvox = min(startvox + blocksize, thedata.shape[0])
+        if thefilter is not None:
+            filteredblock = thefilter.applybatch(samplefreq, thedata[startvox:endvox, :])
+        else:
+            filteredblock = thedata[startvox:endvox, :]
+        out[startvox:endvox] = np.var(filteredblock, axis=1)
+        if meannorm:
+            out[startvox:endvox] /= np.mean(thedata[startvox:endvox, :], axis=1)
     if meannorm:
-        return np.nan_to_num(np.var(filteredim, axis=1) / np.mean(thedata, axis=1))
-    else:
-        return np.var(filteredim, axis=1)
+        np.nan_to_num(out, copy=False)
+    return out
 
 
 # @conditionaljit()
@@ -40,6 +40,11 @@ def _process_data(data_in, inQ, outQ, showprogressbar=True, reportstep=1000, chu
     # send pos/data to workers
     data_out = []
     totalnum = len(data_in)
+    if totalnum > chunksize:
+        # treat chunksize as a ceiling and spread the items evenly over the chunks, so the last
+        # chunk isn't a small remainder that leaves most of the workers idle
+        numchunks = (totalnum + chunksize - 1) // chunksize
+        chunksize = (totalnum + numchunks - 1) // numchunks
     numchunks = int(totalnum // chunksize)
     remainder = totalnum - numchunks * chunksize
     with tqdm(total=totalnum, desc="Voxel", disable=(not showprogressbar)) as pbar:
@@ -77,6 +77,7 @@ def peakevalpass(
     interptype="univariate",
     showprogressbar=True,
     chunksize=1000,
+    peaklagout=None,
     rt_floatset=np.float64,
     rt_floattype="float64",
 ):
@@ -98,6 +99,8 @@ def peakevalpass(
     interptype
     showprogressbar
     chunksize
+    peaklagout - optional array (one entry per voxel) to receive the lag of the highest ranked peak
+                 (unchanged for voxels with no peaks)
     rt_floatset
     rt_floattype
 
@@ -157,6 +160,8 @@ def peakevalpass(
         volumetotal = 0
         for voxel in data_out:
             peakdict[str(voxel[0])] = voxel[1]
+            if peaklagout is not None and len(voxel[1]) > 0:
+                peaklagout[voxel[0]] = voxel[1][0][0]
             volumetotal += 1
         del data_out
     else:
@@ -179,6 +184,8 @@ def peakevalpass(
                 oversampfactor=oversampfactor,
                 interptype=interptype,
             )
+            if peaklagout is not None and len(peakdict[str(vox)]) > 0:
+                peaklagout[vox] = peakdict[str(vox)][0][0]
             volumetotal += 1
     LGR.info(f"\nPeak evaluation performed on {volumetotal} voxels")
 
@@ -189,13 +189,9 @@ def trainratiotooffset(
 
 
 def ratiotodelay(theratio):
+    # works on a single ratio or an array of them; out of range ratios map to the endpoints
     global ratiotooffsetfunc, maplimits
-    if theratio < maplimits[0]:
-        return ratiotooffsetfunc(maplimits[0])
-    elif theratio > maplimits[1]:
-        return ratiotooffsetfunc(maplimits[1])
-    else:
-        return ratiotooffsetfunc(theratio)
+    return ratiotooffsetfunc(np.clip(theratio, maplimits[0], maplimits[1]))
 
 
 def getderivratios(
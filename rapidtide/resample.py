@@ -289,26 +289,21 @@ class FastResampler:
         self.hiresstart = self.hires_x[0]
         self.hiresend = self.hires_x[-1]
         self.method = method
+        padpts = int(self.padtime // self.hiresstep)
         if self.method == "poly":
-            self.hires_y = 0.0 * self.hires_x
-            self.hires_y[
-                int(self.padtime // self.hiresstep)
-                + 1 : -(int(self.padtime // self.hiresstep) + 1)
-            ] = signal.resample_poly(timecourse, int(self.upsampleratio * 10), 10)
+            self.hires_y = np.zeros_like(self.hires_x)
+            self.hires_y[padpts + 1 : -(padpts + 1)] = signal.resample_poly(
+                timecourse, int(self.upsampleratio * 10), 10
+            )
         elif self.method == "fourier":
-            self.hires_y = 0.0 * self.hires_x
-            self.hires_y[
-                int(self.padtime // self.hiresstep)
-                + 1 : -(int(self.padtime // self.hiresstep) + 1)
-            ] = signal.resample(timecourse, self.upsampleratio * len(timeaxis))
+            self.hires_y = np.zeros_like(self.hires_x)
+            self.hires_y[padpts + 1 : -(padpts + 1)] = signal.resample(
+                timecourse, self.upsampleratio * len(timeaxis)
+            )
         else:
             self.hires_y = doresample(timeaxis, timecourse, self.hires_x, method=method)
-        self.hires_y[: int(self.padtime // self.hiresstep)] = self.hires_y[
-            int(self.padtime // self.hiresstep)
-        ]
-        self.hires_y[-int(self.padtime // self.hiresstep) :] = self.hires_y[
-            -int(self.padtime // self.hiresstep)
-        ]
+        self.hires_y[:padpts] = self.hires_y[padpts]
+        self.hires_y[-padpts:] = self.hires_y[-padpts]
         if debug:
             print("FastResampler __init__:")
             print("    padtime:, ", self.padtime)
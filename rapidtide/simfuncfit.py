@@ -184,16 +184,8 @@ def fitcorr(
         themask = None
     else:
         themask = np.where(initiallags > -100000.0, 1, 0)
-    (
-        volumetotal,
-        ampfails,
-        lowlagfails,
-        highlagfails,
-        lowwidthfails,
-        highwidthfails,
-        initfails,
-        fitfails,
-    ) = (0, 0, 0, 0, 0, 0, 0, 0)
+    volumetotal = 0
+    fitfailreasons = np.zeros(inputshape[0], dtype=np.uint32)
 
     if nprocs > 1 or alwaysmultiproc:
         # define the consumer function here so it inherits most of the arguments
@@ -249,25 +241,7 @@ def fitcorr(
         # unpack the data
         volumetotal = 0
         for voxel in data_out:
-            if (
-                thefitter.FML_INITAMPLOW
-                | thefitter.FML_INITAMPHIGH
-                | thefitter.FML_FITAMPLOW
-                | thefitter.FML_FITAMPHIGH
-            ) & voxel[9]:
-                ampfails += 1
-            if (thefitter.FML_INITWIDTHLOW | thefitter.FML_FITWIDTHLOW) & voxel[9]:
-                lowwidthfails += 1
-            if (thefitter.FML_INITWIDTHHIGH | thefitter.FML_FITWIDTHHIGH) & voxel[9]:
-                highwidthfails += 1
-            if (thefitter.FML_INITLAGLOW | thefitter.FML_FITLAGLOW) & voxel[9]:
-                lowlagfails += 1
-            if (thefitter.FML_INITLAGHIGH | thefitter.FML_FITLAGHIGH) & voxel[9]:
-                highlagfails += 1
-            if thefitter.FML_INITFAIL & voxel[9]:
-                initfails += 1
-            if thefitter.FML_FITFAIL & voxel[9]:
-                fitfails += 1
+            fitfailreasons[voxel[0]] = voxel[9]
 
             # if this is a despeckle pass, only accept the new values if the fit did not fail
             if (voxel[9] == 0) or not despeckling:
@@ -327,27 +301,33 @@ def fitcorr(
                     rt_floattype=rt_floattype,
                 )
                 volumetotal += volumetotalinc
-                if (
-                    thefitter.FML_INITAMPLOW
-                    | thefitter.FML_INITAMPHIGH
-                    | thefitter.FML_FITAMPLOW
-                    | thefitter.FML_FITAMPHIGH
-                ) & failreason:
-                    ampfails += 1
-                if (thefitter.FML_INITWIDTHLOW | thefitter.FML_FITWIDTHLOW) & failreason:
-                    lowwidthfails += 1
-                if (thefitter.FML_INITWIDTHHIGH | thefitter.FML_FITWIDTHHIGH) & failreason:
-                    highwidthfails += 1
-                if (thefitter.FML_INITLAGLOW | thefitter.FML_INITLAGHIGH) & failreason:
-                    lowlagfails += 1
-                if (thefitter.FML_INITLAGLOW | thefitter.FML_FITLAGLOW) & failreason:
-                    lowlagfails += 1
-                if (thefitter.FML_INITLAGHIGH | thefitter.FML_FITLAGHIGH) & failreason:
-                    highlagfails += 1
-                if thefitter.FML_INITFAIL & failreason:
-                    initfails += 1
-                if thefitter.FML_FITFAIL & failreason:
-                    fitfails += 1
+                fitfailreasons[vox] = failreason
+
+    # tally the failure modes over the whole volume at once
+    ampfails = np.count_nonzero(
+        fitfailreasons
+        & (
+            thefitter.FML_INITAMPLOW
+            | thefitter.FML_INITAMPHIGH
+            | thefitter.FML_FITAMPLOW
+            | thefitter.FML_FITAMPHIGH
+        )
+    )
+    lowwidthfails = np.count_nonzero(
+        fitfailreasons & (thefitter.FML_INITWIDTHLOW | thefitter.FML_FITWIDTHLOW)
+    )
+    highwidthfails = np.count_nonzero(
+        fitfailreasons & (thefitter.FML_INITWIDTHHIGH | thefitter.FML_FITWIDTHHIGH)
+    )
+    lowlagfails = np.count_nonzero(
+        fitfailreasons & (thefitter.FML_INITLAGLOW | thefitter.FML_FITLAGLOW)
+    )
+    highlagfails = np.count_nonzero(
+        fitfailreasons & (thefitter.FML_INITLAGHIGH | thefitter.FML_FITLAGHIGH)
+    )
+    initfails = np.count_nonzero(fitfailreasons & thefitter.FML_INITFAIL)
+    fitfails = np.count_nonzero(fitfailreasons & thefitter.FML_FITFAIL)
+    del fitfailreasons
 
     LGR.info(f"\nSimilarity function fitted in {volumetotal} voxels")
     LGR.info(
@@ -274,7 +274,7 @@ def sigFromDistributionData(
 
     """
     # check to make sure there are nonzero values first
-    if len(np.where(vallist != 0.0)[0]) == 0:
+    if np.count_nonzero(vallist) == 0:
         print("no nonzero values - skipping percentile calculation")
         return None, 0, 0
     thehistogram, peakheight, peakloc, peakwidth, centerofmass, peakpercentile = makehistogram(
@@ -460,6 +460,79 @@ def kurtosisstats(timecourse):
     return kurtosis(timecourse), testres[0], testres[1]
 
 
+def skewnesskurtosisstats(timecourse):
+    """Calculate the skewness and kurtosis statistics of a timecourse from a single set of
+    central moments.  Equivalent to calling skewnessstats and kurtosisstats, which each
+    recompute the moments twice.
+
+    Parameters
+    ----------
+    timecourse: array
+        The timecourse to test
+
+    :return: skewness, skewness z, skewness p, kurtosis, kurtosis z, kurtosis p
+
+    """
+    n = len(timecourse)
+    themean = np.mean(timecourse)
+    demeaned = timecourse - themean
+    sqdev = demeaned * demeaned
+    m2 = np.mean(sqdev)
+    m3 = np.mean(sqdev * demeaned)
+    m4 = np.mean(sqdev * sqdev)
+    with np.errstate(all="ignore"):
+        if m2 <= (np.finfo(m2.dtype).eps * themean) ** 2:
+            theskewness = np.nan
+            b2 = np.nan
+        else:
+            theskewness = m3 / m2**1.5
+            b2 = m4 / m2**2.0
+
+        # D'Agostino skewness test (same as scipy.stats.skewtest)
+        y = theskewness * np.sqrt(((n + 1) * (n + 3)) / (6.0 * (n - 2)))
+        beta2 = (
+            3.0
+            * (n**2 + 27 * n - 70)
+            * (n + 1)
+            * (n + 3)
+            / ((n - 2.0) * (n + 5) * (n + 7) * (n + 9))
+        )
+        W2 = -1 + np.sqrt(2 * (beta2 - 1))
+        delta = 1 / np.sqrt(0.5 * np.log(W2))
+        alpha = np.sqrt(2.0 / (W2 - 1))
+        if y == 0:
+            y = 1.0
+        skewz = delta * np.log(y / alpha + np.sqrt((y / alpha) ** 2 + 1))
+
+        # Anscombe-Glynn kurtosis test (same as scipy.stats.kurtosistest)
+        E = 3.0 * (n - 1) / (n + 1)
+        varb2 = 24.0 * n * (n - 2) * (n - 3) / ((n + 1) * (n + 1.0) * (n + 3) * (n + 5))
+        x = (b2 - E) / varb2**0.5
+        sqrtbeta1 = (
+            6.0
+            * (n * n - 5 * n + 2)
+            / ((n + 7) * (n + 9))
+            * ((6.0 * (n + 3) * (n + 5)) / (n * (n - 2) * (n - 3))) ** 0.5
+        )
+        A = 6.0 + 8.0 / sqrtbeta1 * (2.0 / sqrtbeta1 + (1 + 4.0 / (sqrtbeta1**2)) ** 0.5)
+        term1 = 1 - 2 / (9.0 * A)
+        denom = 1 + x * (2 / (A - 4.0)) ** 0.5
+        if denom == 0.0:
+            term2 = np.nan
+        else:
+            term2 = np.sign(denom) * ((1 - 2.0 / A) / np.abs(denom)) ** (1 / 3)
+        kurtz = (term1 - term2) / (2 / (9.0 * A)) ** 0.5
+
+    return (
+        theskewness,
+        skewz,
+        2.0 * sp.stats.norm.sf(np.abs(skewz)),
+        b2 - 3.0,
+        kurtz,
+        2.0 * sp.stats.norm.sf(np.abs(kurtz)),
+    )
+
+
 def fast_ICC_rep_anova(Y, nocache=False, debug=False):
     """
     the data Y are entered as a 'table' ie subjects are in rows and repeated
@@ -961,17 +1034,22 @@ def getfracvals(datamat, thefracs, nozero=False, debug=False):
     thevals = []
 
     if nozero:
-        maskmat = np.sort(datamat[np.where(datamat != 0.0)].flatten())
+        maskmat = datamat[np.where(datamat != 0.0)].flatten()
         if len(maskmat) == 0:
             for thisfrac in thefracs:
                 thevals.append(0.0)
             return thevals
     else:
-        maskmat = np.sort(datamat.flatten())
+        maskmat = datamat.flatten()
     maxindex = len(maskmat)
 
-    for thisfrac in thefracs:
-        theindex = np.min([int(np.round(thisfrac * maxindex, 0)), len(maskmat) - 1])
+    # only the requested order statistics are needed, so partition around them rather than
+    # sorting the whole array
+    theindices = [
+        np.min([int(np.round(thisfrac * maxindex, 0)), maxindex - 1]) for thisfrac in thefracs
+    ]
+    maskmat = np.partition(maskmat, np.unique(theindices))
+    for theindex in theindices:
         thevals.append(float(maskmat[theindex]))
 
     if debug:
@@ -1056,4 +1134,4 @@ def getmasksize(themask):
         The number of nonzero voxels in themask
 
     """
-    return len(np.where(themask > 0)[0])
+    return np.count_nonzero(themask > 0)
@@ -16,6 +16,8 @@
 #   limitations under the License.
 #
 #
+from types import SimpleNamespace
+
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
@@ -231,6 +233,121 @@ def test_calcsimfunc(debug=False, displayplots=False):
             assert mse(voxelshifts, lagtimes) < msethresh
 
 
+def test_calcsimfunc_gpu(monkeypatch, debug=False):
+    # CuPy mirrors the numpy API, so substituting numpy for it runs the GPU code path on the CPU
+    numpyascupy = SimpleNamespace(
+        fft=np.fft,
+        max=np.max,
+        absolute=np.absolute,
+        square=np.square,
+        broadcast_to=np.broadcast_to,
+        where=np.where,
+        asarray=np.asarray,
+        argmax=np.argmax,
+        asnumpy=np.asarray,
+        get_default_memory_pool=lambda: SimpleNamespace(free_all_blocks=lambda: None),
+    )
+    monkeypatch.setattr(tide_calcsimfunc, "cp", numpyascupy, raising=False)
+    monkeypatch.setattr(tide_calcsimfunc, "cupypresent", True)
+
+    # make some data
+    np.random.seed(12345)
+    oversampfactor = 2
+    numvoxels = 50
+    numtimepoints = 300
+    tr = 0.72
+    Fs = 1.0 / tr
+    init_fmri_x = np.linspace(0.0, numtimepoints, numtimepoints, endpoint=False) * tr
+    oversampfreq = oversampfactor * Fs
+    os_fmri_x = np.linspace(
+        0.0, numtimepoints * oversampfactor, numtimepoints * oversampfactor
+    ) * (1.0 / oversampfreq)
+    testfreq = 0.075
+    sourcedata = np.sin(2.0 * np.pi * testfreq * os_fmri_x) + 0.1 * np.random.standard_normal(
+        len(os_fmri_x)
+    )
+    voxelshifts = np.linspace(-5.0, 5.0, numvoxels, endpoint=False)
+    theinputdata = np.zeros((numvoxels, numtimepoints), dtype=np.float64)
+    for i in range(numvoxels):
+        theinputdata[i, :] = np.sin(
+            2.0 * np.pi * testfreq * (init_fmri_x - voxelshifts[i])
+        ) + 0.5 * np.random.standard_normal(numtimepoints)
+    lagmininpts = int((10.0 * oversampfreq) - 0.5)
+    lagmaxinpts = int((10.0 * oversampfreq) + 0.5)
+    numcorrpoints = lagmaxinpts + lagmininpts
+
+    # the same staging buffer is reused for every call, as it is from pass to pass in rapidtide
+    preptcbuf = np.zeros((numvoxels, len(os_fmri_x)), dtype=np.float64)
+    for corrweighting in ["None", "phat", "liang", "eckart", "regressor"]:
+        theCorrelator = tide_classes.Correlator(
+            Fs=oversampfreq,
+            ncprefilter=tide_filt.NoncausalFilter("lfo"),
+            detrendorder=3,
+            windowfunc="hamming",
+            corrweighting=corrweighting,
+        )
+        assert tide_calcsimfunc.gpucorrelationavailable(theCorrelator)
+
+        corrout_cpu = np.zeros((numvoxels, numcorrpoints), dtype=np.float64)
+        meanval_cpu = np.zeros(numvoxels, dtype=np.float64)
+        globalmax_cpu = np.zeros(numvoxels, dtype=np.int32)
+        voxels_cpu, dummy, corrscale_cpu = tide_calcsimfunc.correlationpass(
+            theinputdata,
+            sourcedata,
+            theCorrelator,
+            init_fmri_x,
+            os_fmri_x,
+            lagmininpts,
+            lagmaxinpts,
+            corrout_cpu,
+            meanval_cpu,
+            oversampfactor=oversampfactor,
+            showprogressbar=False,
+            globalmaxout=globalmax_cpu,
+        )
+
+        for nprocs in [1, 2]:
+            corrout_gpu = np.zeros((numvoxels, numcorrpoints), dtype=np.float64)
+            meanval_gpu = np.zeros(numvoxels, dtype=np.float64)
+            globalmax_gpu = np.zeros(numvoxels, dtype=np.int32)
+            voxels_gpu, dummy, corrscale_gpu = tide_calcsimfunc.correlationpass_gpu(
+                theinputdata,
+                sourcedata,
+                theCorrelator,
+                init_fmri_x,
+                os_fmri_x,
+                lagmininpts,
+                lagmaxinpts,
+                corrout_gpu,
+                meanval_gpu,
+                nprocs=nprocs,
+                oversampfactor=oversampfactor,
+                showprogressbar=False,
+                batchsize=16,
+                globalmaxout=globalmax_gpu,
+                preptcbuf=preptcbuf,
+            )
+            if debug:
+                print(
+                    f"{corrweighting=}, {nprocs=}: max difference "
+                    f"{np.max(np.abs(corrout_cpu - corrout_gpu))}"
+                )
+            assert voxels_cpu == voxels_gpu == numvoxels
+            assert np.allclose(corrscale_cpu, corrscale_gpu)
+            assert np.allclose(meanval_cpu, meanval_gpu)
+            assert np.allclose(corrout_cpu, corrout_gpu, rtol=1e-8, atol=1e-8)
+            assert np.array_equal(globalmax_cpu, globalmax_gpu)
+
+    # zero padded correlations are not reproduced on the GPU
+    for corrpadding in [-1, 100]:
+        theCorrelator = tide_classes.Correlator(
+            Fs=oversampfreq,
+            ncprefilter=tide_filt.NoncausalFilter("lfo"),
+            corrpadding=corrpadding,
+        )
+        assert not tide_calcsimfunc.gpucorrelationavailable(theCorrelator)
+
+
 if __name__ == "__main__":
     mpl.use("TkAgg")
     test_calcsimfunc(debug=True, displayplots=True)
@@ -238,6 +238,7 @@ def test_delayestimation(displayplots=False, debug=False):
         # call peakeval
         if debug:
             print("\n\ncalling peakeval")
+        mipeaks = np.zeros(numlocs, dtype=np.float64)
         voxelsprocessed_pe, thepeakdict = tide_peakeval.peakevalpass(
             waveforms[:, :],
             referencetc,
@@ -253,11 +254,17 @@ def test_delayestimation(displayplots=False, debug=False):
             interptype=interptype,
             showprogressbar=False,
             chunksize=chunksize,
+            peaklagout=mipeaks,
         )
 
         if debug:
             for key in thepeakdict:
                 print(key, thepeakdict[key])
+        for i in range(numlocs):
+            if len(thepeakdict[str(i)]) > 0:
+                assert mipeaks[i] == thepeakdict[str(i)][0][0]
+            else:
+                assert mipeaks[i] == 0.0
 
         # call thefitter
         if debug:
@@ -16,12 +16,19 @@
 #   limitations under the License.
 #
 #
+import pickle
+
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 import scipy as sp
 
-from rapidtide.filter import NoncausalFilter
+from rapidtide.filter import (
+    NoncausalFilter,
+    arb_pass,
+    getneighborhoodindices,
+    neighborhoodmedian,
+)
 
 
 def maketestwaves(timeaxis):
@@ -298,6 +305,66 @@ def test_filterprops(displayplots=False, debug=False):
     )
 
 
+def test_neighborhoodmedian(debug=False):
+    rng = np.random.default_rng(12345)
+    for theshape in [(20,), (8, 9), (6, 7, 5), (1, 1, 1, 1, 50)]:
+        thedata = rng.standard_normal(theshape)
+        thevoxels = np.sort(rng.choice(thedata.size, thedata.size // 3, replace=False))
+        neighborindices = getneighborhoodindices(theshape, thevoxels)
+        if debug:
+            print(theshape, neighborindices.shape)
+        assert neighborindices.shape == (len(thevoxels), 3 ** len(theshape))
+        np.testing.assert_array_equal(
+            neighborhoodmedian(thedata, neighborindices),
+            sp.ndimage.median_filter(thedata, 3).reshape(-1)[thevoxels],
+        )
+
+
+def test_applybatch(debug=False):
+    rng = np.random.default_rng(54321)
+    thedata = rng.standard_normal((500, 200))
+    for filtertype in ["lfo", "resp_stop"]:
+        for transferfunc in ["trapezoidal", "brickwall", "butterworth"]:
+            thefilter = NoncausalFilter(filtertype, transferfunc=transferfunc)
+            rowbyrow = np.array([thefilter.apply(1.0 / 0.72, therow) for therow in thedata])
+            batch = thefilter.applybatch(1.0 / 0.72, thedata)
+            if debug:
+                print(filtertype, transferfunc, np.max(np.abs(batch - rowbyrow)))
+            assert np.allclose(batch, rowbyrow, atol=1e-6)
+            threaded = thefilter.applybatch(1.0 / 0.72, thedata, maxmatrixlen=0, nthreads=4)
+            assert np.allclose(threaded, rowbyrow, atol=1e-6)
+
+
+def test_fftplancache(debug=False):
+    # the filter keeps its own FFT plans - reusing them must not change the answer
+    rng = np.random.default_rng(13579)
+    Fs = 1.0 / 0.72
+    thefilter = NoncausalFilter("lfo")
+    for thelen in [200, 201, 200, 350, 200]:
+        thedata = rng.standard_normal(thelen)
+        # apply first, since it may adjust the filter limits to suit the data length
+        filtered = thefilter.apply(Fs, thedata)
+        padlen = int(thefilter.padtime * Fs)
+        uncached = arb_pass(
+            Fs,
+            thedata,
+            thefilter.lowerstop,
+            thefilter.lowerpass,
+            thefilter.upperpass,
+            thefilter.upperstop,
+            transferfunc=thefilter.transferfunc,
+            padlen=padlen,
+            avlen=np.min([int(Fs / thefilter.lowerpass), padlen]),
+        )
+        if debug:
+            print(thelen, np.max(np.abs(filtered - uncached)))
+        assert np.allclose(filtered, uncached, atol=1e-10)
+
+    # filters with plans attached still pickle, and the copy gives the same answer
+    thecopy = pickle.loads(pickle.dumps(thefilter))
+    assert np.allclose(thecopy.apply(Fs, thedata), thefilter.apply(Fs, thedata), atol=1e-10)
+
+
 if __name__ == "__main__":
     mpl.use("TkAgg")
     test_filterprops(displayplots=True, debug=True)
@@ -145,6 +145,77 @@ def test_glmpass(debug=True, displayplots=False):
                     if not confoundglm:
                         assert mse(datatoremove, targetarray) < 1e-3
 
+                        # the removed signal is optional - the filtered data must not change
+                        savedfiltereddata = filtereddata.copy()
+                        tide_glmpass.glmpass(
+                            xsize,
+                            testarray,
+                            thisthreshval,
+                            waveforms,
+                            meanvals,
+                            rvals,
+                            r2vals,
+                            fitcoffs,
+                            fitNorm,
+                            None,
+                            filtereddata,
+                            showprogressbar=False,
+                            procbyvoxel=procbyvoxel,
+                            nprocs=nprocs,
+                            confoundglm=confoundglm,
+                        )
+                        assert np.array_equal(filtereddata, savedfiltereddata)
+
+
+def test_glmpass_compiled(debug=False):
+    # the compiled single process path must match the per voxel fit, with and without derivatives,
+    # for double and single precision data
+    if tide_glmpass.donotusenumba:
+        return
+    np.random.seed(12345)
+    numvoxels = 200
+    tsize = 150
+    baseevs = np.random.standard_normal((numvoxels, tsize))
+    baseevs[::10, :] = 0.0
+    testarray = 100.0 + 3.0 * baseevs + np.random.standard_normal((numvoxels, tsize))
+    for thedtype, thetol in [(np.float64, 1e-9), (np.float32, 1e-5)]:
+        for nderivs in [0, 1, 2]:
+            if nderivs > 0:
+                theevs = tide_glmpass.makevoxelspecificderivs(baseevs, nderivs)
+                coffshape = (numvoxels, nderivs + 1)
+            else:
+                theevs = baseevs
+                coffshape = numvoxels
+            results = {}
+            for usenumba in [False, True]:
+                tide_glmpass.donotusenumba = not usenumba
+                theoutputs = [
+                    np.zeros(numvoxels),
+                    np.zeros(numvoxels),
+                    np.zeros(numvoxels),
+                    np.zeros(coffshape),
+                    np.zeros(coffshape),
+                    np.zeros((numvoxels, tsize)),
+                    np.zeros((numvoxels, tsize)),
+                ]
+                results[usenumba] = theoutputs
+                numfit = tide_glmpass.glmpass(
+                    numvoxels,
+                    testarray.astype(thedtype),
+                    10.0,
+                    theevs,
+                    *theoutputs,
+                    showprogressbar=False,
+                )
+                assert numfit == numvoxels
+            tide_glmpass.donotusenumba = False
+            for theslow, thefast in zip(results[False], results[True]):
+                if debug:
+                    print(
+                        f"{thedtype=}, {nderivs=}: max difference {np.max(np.abs(theslow - thefast))}"
+                    )
+                assert np.allclose(theslow, thefast, rtol=thetol, atol=thetol)
+
 
 if __name__ == "__main__":
     mpl.use("TkAgg")
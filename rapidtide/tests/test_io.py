@@ -454,6 +454,117 @@ def test_io(debug=True, displayplots=False):
             dataarray.astype(thedtype), theheader, os.path.join(DESTDIR, "dtypetest"), debug=debug
         )
 
+    # boolean masks are written as uint8
+    tide_io.savetonifti(dataarray > 0.5, theheader, os.path.join(DESTDIR, "booltest"))
+    dummy, readdata, dummy, dummy, dummy = tide_io.readfromnifti(
+        os.path.join(DESTDIR, "booltest.nii.gz")
+    )
+    assert np.array_equal(readdata, (dataarray > 0.5).astype(np.uint8))
+
+    # test that an explicit compression level still writes a readable, identical file
+    for thelevel in [0, 9]:
+        tide_io.savetonifti(
+            dataarray.astype(np.float32),
+            theheader,
+            os.path.join(DESTDIR, f"compressleveltest{thelevel}"),
+            compresslevel=thelevel,
+        )
+        dummy, readdata, dummy, dummy, dummy = tide_io.readfromnifti(
+            os.path.join(DESTDIR, f"compressleveltest{thelevel}.nii.gz")
+        )
+        assert np.array_equal(readdata, dataarray.astype(np.float32))
+
+    # test that saving a map list with several threads writes the same maps as saving serially
+    mapshape = (6, 5, 4)
+    mapheader = tide_io.niftihdrfromarray(np.zeros(mapshape, dtype=np.float32))
+    validvoxels = np.arange(0, np.prod(mapshape), 2)
+    maplist = [
+        (
+            np.random.random(len(validvoxels)).astype(np.float32),
+            f"savemaptest{i}",
+            "map",
+            None,
+            None,
+        )
+        for i in range(4)
+    ]
+    for nthreads in [1, 4]:
+        tide_io.savemaplist(
+            os.path.join(DESTDIR, f"savemaplist_nthreads{nthreads}"),
+            maplist,
+            validvoxels,
+            mapshape,
+            mapheader,
+            {},
+            rt_floattype="float32",
+            nthreads=nthreads,
+        )
+    for themap, mapsuffix, maptype, theunit, thedescription in maplist:
+        targetmap = np.zeros(np.prod(mapshape), dtype=np.float32)
+        targetmap[validvoxels] = themap
+        for nthreads in [1, 4]:
+            dummy, savedmap, dummy, dummy, dummy = tide_io.readfromnifti(
+                os.path.join(DESTDIR, f"savemaplist_nthreads{nthreads}_desc-{mapsuffix}_{maptype}")
+            )
+            assert np.array_equal(savedmap.reshape(np.prod(mapshape)), targetmap)
+
+    # saving full maps (no valid voxel list) must leave the caller's arrays alone
+    fullmaplist = [
+        (
+            np.random.random(np.prod(mapshape)).astype(np.float32),
+            f"savefullmaptest{i}",
+            "map",
+            None,
+            None,
+        )
+        for i in range(2)
+    ]
+    fullmapcopies = [themap.copy() for themap, dummy, dummy, dummy, dummy in fullmaplist]
+    tide_io.savemaplist(
+        os.path.join(DESTDIR, "savemaplist_full"),
+        fullmaplist,
+        None,
+        mapshape,
+        mapheader,
+        {},
+        rt_floattype="float32",
+    )
+    for i in range(len(fullmaplist)):
+        assert np.array_equal(fullmaplist[i][0], fullmapcopies[i])
+
+    # entries can override the valid voxel list, and voxels from one set must not leak into the next
+    oddvoxels = np.arange(1, np.prod(mapshape), 2)
+    mixedmaplist = [
+        (maplist[0][0], "savemixedtest0", "map", None, None),
+        (fullmaplist[0][0], "savemixedtest1", "map", None, None, None),
+        (maplist[1][0], "savemixedtest2", "map", None, None, oddvoxels),
+        (maplist[2][0], "savemixedtest3", "map", None, None),
+    ]
+    mixedvoxels = [validvoxels, None, oddvoxels, validvoxels]
+    for nthreads in [1, 4]:
+        tide_io.savemaplist(
+            os.path.join(DESTDIR, f"savemaplist_mixed_nthreads{nthreads}"),
+            mixedmaplist,
+            validvoxels,
+            mapshape,
+            mapheader,
+            {},
+            rt_floattype="float32",
+            nthreads=nthreads,
+        )
+        for themapentry, thevoxels in zip(mixedmaplist, mixedvoxels):
+            if thevoxels is None:
+                targetmap = themapentry[0]
+            else:
+                targetmap = np.zeros(np.prod(mapshape), dtype=np.float32)
+                targetmap[thevoxels] = themapentry[0]
+            dummy, savedmap, dummy, dummy, dummy = tide_io.readfromnifti(
+                os.path.join(
+                    DESTDIR, f"savemaplist_mixed_nthreads{nthreads}_desc-{themapentry[1]}_map"
+                )
+            )
+            assert np.array_equal(savedmap.reshape(np.prod(mapshape)), targetmap)
+
 
 if __name__ == "__main__":
     test_io(debug=True, displayplots=True)
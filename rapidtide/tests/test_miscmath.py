@@ -21,6 +21,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 import rapidtide.miscmath as tide_math
+from rapidtide.filter import NoncausalFilter
 from rapidtide.tests.utils import mse
 
 
@@ -91,6 +92,19 @@ def test_math(debug=False, displayplots=False):
     # trendfilt test
     # tested externally
 
+    # imagevariance test - the blocked version must match filtering every voxel
+    theimage = 100.0 + np.random.randn(250, numpoints)
+    thefilter = NoncausalFilter("lfo")
+    thevars = tide_math.imagevariance(theimage, thefilter, 1.0, blocksize=100)
+    for thevoxel in range(0, theimage.shape[0], 50):
+        targetvar = np.var(thefilter.apply(1.0, theimage[thevoxel, :])) / np.mean(
+            theimage[thevoxel, :]
+        )
+        assert np.fabs(thevars[thevoxel] - targetvar) < EPSILON * targetvar
+    assert np.allclose(
+        tide_math.imagevariance(theimage, None, 1.0, meannorm=False), np.var(theimage, axis=1)
+    )
+
     # ComplexPCA test
     the2darray = np.zeros((6, numpoints), dtype=float)
 
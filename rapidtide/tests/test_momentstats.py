@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#   Copyright 2016-2024 Blaise Frederick
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+#
+import numpy as np
+
+import rapidtide.stats as tide_stats
+
+
+def test_skewnesskurtosisstats(debug=False):
+    rng = np.random.default_rng(seed=2024)
+    for thedata in [
+        rng.standard_normal(500),
+        rng.gamma(2.0, size=4000),
+        rng.standard_normal(300).astype(np.float32),
+    ]:
+        combined = tide_stats.skewnesskurtosisstats(thedata)
+        separate = tide_stats.skewnessstats(thedata) + tide_stats.kurtosisstats(thedata)
+        if debug:
+            print(combined)
+            print(separate)
+        assert np.allclose(combined, separate, rtol=1e-6)
+
+
+if __name__ == "__main__":
+    test_skewnesskurtosisstats(debug=True)
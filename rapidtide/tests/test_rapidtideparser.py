@@ -84,6 +84,10 @@ testlist["nodelayfit"] = {
         ["fixdelay", True],
     ],
 }
+testlist["compresslevel"] = {
+    "command": ["--compresslevel", "0"],
+    "results": [["compresslevel", 0]],
+}
 
 
 def checktests(testvec, testlist, theargs, epsilon):
@@ -123,6 +127,7 @@ def main():
     testvec.append("interptype")
     testvec.append("offsettime")
     testvec.append("datafreq")
+    testvec.append("compresslevel")
 
     print(testlist)
     print(testvec)
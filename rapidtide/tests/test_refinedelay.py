@@ -196,6 +196,9 @@ def eval_refinedelay(
     delayoffset = filteredglmderivratios * 0.0
     for i in range(filteredglmderivratios.shape[0]):
         delayoffset[i] = tide_refinedelay.ratiotodelay(filteredglmderivratios[i])
+    np.testing.assert_allclose(
+        tide_refinedelay.ratiotodelay(filteredglmderivratios), delayoffset, rtol=1e-12
+    )
 
     # do the tests
     msethresh = 0.1
@@ -553,31 +553,35 @@ def proctiminglogfile(logfilename, timewidth=10):
         names=["time", "description", "number", "units"],
         engine="python",
     )
-    starttime = datetime.strptime(timingdata["time"].iloc[0], "%Y%m%dT%H%M%S.%f")
+    # pull the columns out once, and parse each timestamp only once, rather than indexing the
+    # dataframe (and reparsing the previous time) on every row
+    thetimes = [datetime.strptime(thetime, "%Y%m%dT%H%M%S.%f") for thetime in timingdata["time"]]
+    thedescriptions = timingdata["description"].tolist()
+    thenumbers = timingdata["number"].tolist()
+    theunits = timingdata["units"].tolist()
+    starttime = thetimes[0]
     outputlines = [f"{'Total (s)'.rjust(timewidth)}\t{'Diff. (s)'.rjust(timewidth)}\tDescription"]
-    outputlines += [
-        f"{'0.0'.rjust(timewidth)}\t{'0.0'.rjust(timewidth)}\t{timingdata['description'].iloc[0]}"
-    ]
-    for therow in range(1, timingdata.shape[0]):
-        thistime = datetime.strptime(timingdata["time"].iloc[therow], "%Y%m%dT%H%M%S.%f")
-        prevtime = datetime.strptime(timingdata["time"].iloc[therow - 1], "%Y%m%dT%H%M%S.%f")
-        totaldiff = (thistime - starttime).total_seconds()
-        incdiff = (thistime - prevtime).total_seconds()
+    outputlines += [f"{'0.0'.rjust(timewidth)}\t{'0.0'.rjust(timewidth)}\t{thedescriptions[0]}"]
+    for therow in range(1, len(thetimes)):
+        totaldiff = (thetimes[therow] - starttime).total_seconds()
+        incdiff = (thetimes[therow] - thetimes[therow - 1]).total_seconds()
         totaldiffstr = f"{totaldiff:.2f}".rjust(timewidth)
         incdiffstr = f"{incdiff:.2f}".rjust(timewidth)
-        theoutputline = f"{totaldiffstr}\t{incdiffstr}\t{timingdata['description'].iloc[therow]}"
+        theoutputline = f"{totaldiffstr}\t{incdiffstr}\t{thedescriptions[therow]}"
         try:
-            dummy = np.isnan(timingdata["number"].iloc[therow])
+            dummy = np.isnan(thenumbers[therow])
         except:
             pass
         else:
-            if not np.isnan(timingdata["number"].iloc[therow]):
-                speedunit = f"{timingdata['units'].iloc[therow]}/s"
+            if not np.isnan(thenumbers[therow]):
+                speedunit = f"{theunits[therow]}/s"
                 if incdiff == 0.0:
                     speed = "undefined"
                 else:
-                    speed = f"{float(timingdata['number'].iloc[therow]) / incdiff:.2f}"
-                theoutputline += f" ({timingdata['number'].iloc[therow]} {timingdata['units'].iloc[therow]} @ {speed} {speedunit})"
+                    speed = f"{float(thenumbers[therow]) / incdiff:.2f}"
+                theoutputline += (
+                    f" ({thenumbers[therow]} {theunits[therow]} @ {speed} {speedunit})"
+                )
         outputlines += [theoutputline]
 
     return outputlines, totaldiff
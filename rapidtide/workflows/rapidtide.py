@@ -16,7 +16,10 @@
 #   limitations under the License.
 #
 #
+import concurrent.futures
+import contextlib
 import copy
+import functools
 import gc
 import logging
 import os
@@ -26,8 +29,6 @@ import warnings
 from pathlib import Path
 
 import numpy as np
-from scipy import ndimage
-from scipy.stats import rankdata
 from sklearn.decomposition import PCA
 from tqdm import tqdm
 
@@ -106,7 +107,7 @@ def getglobalsignal(
     global rt_floatset, rt_floattype
     globalmean = rt_floatset(indata[0, :])
     thesize = np.shape(themask)
-    numvoxelsused = int(np.sum(np.where(themask > 0.0, 1, 0)))
+    numvoxelsused = np.count_nonzero(themask > 0.0)
     selectedvoxels = indata[np.where(themask > 0.0), :][0]
     if debug:
         print(f"getglobalsignal: {selectedvoxels.shape=}")
@@ -216,6 +217,24 @@ def echocancel(thetimecourse, echooffset, thetimestep, outputname, padtimepoints
     return outputtimecourse, echofit, echoR2
 
 
+def denserank(thearray):
+    # equivalent to rankdata(thearray, method="dense") - 1, without scipy's intermediates
+    order = np.argsort(thearray, kind="stable")
+    sortedvals = thearray[order]
+    ranks = np.empty(len(thearray), dtype=np.int64)
+    ranks[order] = np.cumsum(np.concatenate(([False], sortedvals[1:] != sortedvals[:-1])))
+    return ranks
+
+
+def copyheader(theheader):
+    # nibabel headers have a fast field-wise copy; anything else (like None for text input)
+    # falls back to deepcopy
+    if hasattr(theheader, "copy"):
+        return theheader.copy()
+    else:
+        return copy.deepcopy(theheader)
+
+
 def disablemkl(numprocs, debug=False):
     if mklexists:
         if numprocs > 1:
@@ -231,6 +250,16 @@ def enablemkl(numthreads, debug=False):
         mkl.set_num_threads(numthreads)
 
 
+@contextlib.contextmanager
+def mklsuspended(numprocs, numthreads, debug=False):
+    # limit MKL to one thread while numprocs worker processes run, and always restore it after
+    disablemkl(numprocs, debug=debug)
+    try:
+        yield
+    finally:
+        enablemkl(numthreads, debug=debug)
+
+
 def rapidtide_main(argparsingfunc):
     threaddebug = False
     optiondict, theprefilter = argparsingfunc
@@ -321,6 +350,7 @@ def rapidtide_main(argparsingfunc):
     # disable numba now if we're going to do it (before any jits)
     if optiondict["nonumba"]:
         tide_util.disablenumba()
+        tide_glmpass.disablenumba()
 
     # set the internal precision
     global rt_floatset, rt_floattype
@@ -475,7 +505,7 @@ def rapidtide_main(argparsingfunc):
 
     # check to see if we need to adjust the oversample factor
     if optiondict["oversampfactor"] < 0:
-        optiondict["oversampfactor"] = int(np.max([np.ceil(fmritr / 0.5), 1]))
+        optiondict["oversampfactor"] = int(max(np.ceil(fmritr / 0.5), 1))
         LGR.debug(f"oversample factor set to {optiondict['oversampfactor']}")
 
     oversamptr = fmritr / optiondict["oversampfactor"]
@@ -763,7 +793,7 @@ def rapidtide_main(argparsingfunc):
         corrmask += 1
         threshval = -10000000.0
     if not (fileiscifti or optiondict["textio"]):
-        theheader = copy.deepcopy(nim_hdr)
+        theheader = nim_hdr.copy()
         theheader["dim"][0] = 3
         theheader["dim"][4] = 1
         theheader["pixdim"][4] = 1.0
@@ -777,7 +807,23 @@ def rapidtide_main(argparsingfunc):
         np.savetxt(f"{outputname}_validvoxels.txt", validvoxels)
     numvalidspatiallocs = np.shape(validvoxels)[0]
     LGR.debug(f"validvoxels shape = {numvalidspatiallocs}")
-    fmri_data_valid = fmri_data[validvoxels, :] + 0.0
+    if optiondict["sharedmem"]:
+        # gather the valid voxels directly into shared memory, rather than making a local copy
+        # and then copying that, so worker processes all see the same pages
+        LGR.info("moving fmri data to shared memory")
+        TimingLGR.verbose("Start moving fmri_data to shared memory")
+        fmri_data_valid, fmri_data_valid_shm = tide_util.allocshared(
+            (numvalidspatiallocs, np.shape(fmri_data)[1]),
+            rt_floatset,
+            name=f"fmri_data_valid_{optiondict['pid']}",
+        )
+        gatherblocksize = 1000
+        for startvox in range(0, numvalidspatiallocs, gatherblocksize):
+            endvox = min(startvox + gatherblocksize, numvalidspatiallocs)
+            fmri_data_valid[startvox:endvox, :] = fmri_data[validvoxels[startvox:endvox], :]
+        TimingLGR.verbose("End moving fmri_data to shared memory")
+    else:
+        fmri_data_valid = fmri_data[validvoxels, :] + 0.0
     LGR.verbose(
         f"original size = {np.shape(fmri_data)}, trimmed size = {np.shape(fmri_data_valid)}"
     )
@@ -818,18 +864,6 @@ def rapidtide_main(argparsingfunc):
 
     tide_util.logmem("after selecting valid voxels")
 
-    # move fmri_data_valid into shared memory
-    if optiondict["sharedmem"]:
-        LGR.info("moving fmri data to shared memory")
-        TimingLGR.verbose("Start moving fmri_data to shared memory")
-        numpy2shared_func = addmemprofiling(
-            tide_util.numpy2shared, optiondict["memprofile"], "before fmri data move"
-        )
-        fmri_data_valid, fmri_data_valid_shm = numpy2shared_func(
-            fmri_data_valid, rt_floatset, name=f"fmri_data_valid_{optiondict['pid']}"
-        )
-        TimingLGR.verbose("End moving fmri_data to shared memory")
-
     # read in any motion and/or other confound regressors here
     if optiondict["motionfilename"] is not None:
         LGR.info("preparing motion regressors")
@@ -883,24 +917,25 @@ def rapidtide_main(argparsingfunc):
             append=False,
         )
 
-        disablemkl(optiondict["nprocs_confoundregress"], debug=threaddebug)
-        (
-            mergedregressors,
-            mergedregressorlabels,
-            fmri_data_valid,
-            confoundr2,
-        ) = tide_glmpass.confoundregress(
-            mergedregressors,
-            mergedregressorlabels,
-            fmri_data_valid,
-            fmritr,
-            nprocs=optiondict["nprocs_confoundregress"],
-            tcstart=validstart,
-            tcend=validend + 1,
-            orthogonalize=optiondict["orthogonalize"],
-            showprogressbar=optiondict["showprogressbar"],
-        )
-        enablemkl(optiondict["mklthreads"], debug=threaddebug)
+        with mklsuspended(
+            optiondict["nprocs_confoundregress"], optiondict["mklthreads"], debug=threaddebug
+        ):
+            (
+                mergedregressors,
+                mergedregressorlabels,
+                fmri_data_valid,
+                confoundr2,
+            ) = tide_glmpass.confoundregress(
+                mergedregressors,
+                mergedregressorlabels,
+                fmri_data_valid,
+                fmritr,
+                nprocs=optiondict["nprocs_confoundregress"],
+                tcstart=validstart,
+                tcend=validend + 1,
+                orthogonalize=optiondict["orthogonalize"],
+                showprogressbar=optiondict["showprogressbar"],
+            )
         if confoundr2 is None:
             print("There are no nonzero confound regressors - exiting")
             sys.exit()
@@ -965,7 +1000,7 @@ def rapidtide_main(argparsingfunc):
 
         if optiondict["saveconfoundfiltered"]:
             if not optiondict["textio"]:
-                theheader = copy.deepcopy(nim_hdr)
+                theheader = nim_hdr.copy()
                 if fileiscifti:
                     nativefmrishape = (1, 1, 1, validtimepoints, numspatiallocs)
                     timeindex = theheader["dim"][0] - 1
@@ -1058,7 +1093,7 @@ def rapidtide_main(argparsingfunc):
         inputperiod = meanperiod
         inputstarttime = meanstarttime
         inputvec = meanvec
-        theheader = copy.deepcopy(nim_hdr)
+        theheader = copyheader(nim_hdr)
 
         # save the meanmask
         if not optiondict["textio"]:
@@ -1404,7 +1439,8 @@ def rapidtide_main(argparsingfunc):
         f"{len(initial_fmri_x)} "
         f"{len(resampnonosref_y)}"
     )
-    previousnormoutputdata = resampnonosref_y + 0.0
+    # resampnonosref_y may be modified in place below, so this needs its own copy
+    previousnormoutputdata = resampnonosref_y.copy()
 
     # save the factor used to normalize the input regressor
     optiondict["initialmovingregressornormfac"] = np.std(resampnonosref_y)
@@ -1472,16 +1508,14 @@ def rapidtide_main(argparsingfunc):
             append=False,
         )
 
-    (
-        optiondict["kurtosis_reference_pass1"],
-        optiondict["kurtosisz_reference_pass1"],
-        optiondict["kurtosisp_reference_pass1"],
-    ) = tide_stats.kurtosisstats(resampref_y)
     (
         optiondict["skewness_reference_pass1"],
         optiondict["skewnessz_reference_pass1"],
         optiondict["skewnessp_reference_pass1"],
-    ) = tide_stats.skewnessstats(resampref_y)
+        optiondict["kurtosis_reference_pass1"],
+        optiondict["kurtosisz_reference_pass1"],
+        optiondict["kurtosisp_reference_pass1"],
+    ) = tide_stats.skewnesskurtosisstats(resampref_y)
     tide_io.writebidstsv(
         f"{outputname}_desc-movingregressor_timeseries",
         tide_math.stdnormalize(resampnonosref_y),
@@ -1538,6 +1572,11 @@ def rapidtide_main(argparsingfunc):
 
     theCorrelator.setlimits(lagmininpts, lagmaxinpts)
     dummy, trimmedcorrscale, dummy = theCorrelator.getfunction()
+    if optiondict["usegpu"] and not tide_calcsimfunc.gpucorrelationavailable(theCorrelator):
+        LGR.warning(
+            "GPU correlation requires CuPy and circular (unpadded) correlation - using the CPU"
+        )
+        optiondict["usegpu"] = False
 
     # initialize the MutualInformationator
     theMutualInformationator = tide_classes.MutualInformationator(
@@ -1617,6 +1656,17 @@ def rapidtide_main(argparsingfunc):
     lagstrengths = np.zeros(internalvalidspaceshape, dtype=rt_floattype)
     lagsigma = np.zeros(internalvalidspaceshape, dtype=rt_floattype)
     fitmask = np.zeros(internalvalidspaceshape, dtype="uint16")
+    offsetmask = np.zeros(internalvalidspaceshape, dtype="uint16")
+    # the offset include and exclude masks never change, so combine them into one selector up front
+    offsetexcludedvoxels = None
+    if internaloffsetincludemask_valid is not None:
+        offsetexcludedvoxels = internaloffsetincludemask_valid == 0
+    if internaloffsetexcludemask_valid is not None:
+        if offsetexcludedvoxels is None:
+            offsetexcludedvoxels = internaloffsetexcludemask_valid != 0.0
+        else:
+            offsetexcludedvoxels |= internaloffsetexcludemask_valid != 0.0
+    overallmask = np.zeros(internalvalidspaceshape, dtype="uint16")
     failreason = np.zeros(internalvalidspaceshape, dtype="uint32")
     R2 = np.zeros(internalvalidspaceshape, dtype=rt_floattype)
     outmaparray = np.zeros(internalspaceshape, dtype=rt_floattype)
@@ -1635,7 +1685,11 @@ def rapidtide_main(argparsingfunc):
     LGR.debug(
         f"allocating memory for correlation arrays {internalcorrshape} {internalvalidcorrshape}"
     )
-    if optiondict["sharedmem"]:
+    # always put the correlation arrays in shared memory when forking workers to avoid copy on write
+    optiondict["sharedcorrarrays"] = optiondict["sharedmem"] or (
+        optiondict["nprocs_calcsimilarity"] > 1 or optiondict["alwaysmultiproc"]
+    )
+    if optiondict["sharedcorrarrays"]:
         corrout, corrout_shm = tide_util.allocshared(
             internalvalidcorrshape, rt_floatset, name=f"corrout_{optiondict['pid']}"
         )
@@ -1674,7 +1728,7 @@ def rapidtide_main(argparsingfunc):
                 initialdelay_dims,
                 initialdelay_sizes,
             ) = tide_io.readfromnifti(optiondict["initialdelayvalue"])
-            theheader = copy.deepcopy(nim_hdr)
+            theheader = copyheader(nim_hdr)
             if not optiondict["textio"]:
                 if fileiscifti:
                     timeindex = theheader["dim"][0] - 1
@@ -1763,8 +1817,6 @@ def rapidtide_main(argparsingfunc):
         print(f"allocated {thesize:.3f} {theunit} {ramlocation} for refinement")
         tide_util.logmem("after refinement array allocation")
 
-    outfmriarray = np.zeros(internalfmrishape, dtype=rt_floattype)
-
     # cycle over all voxels
     refine = True
     LGR.verbose(f"refine is set to {refine}")
@@ -1791,6 +1843,18 @@ def rapidtide_main(argparsingfunc):
         zerooutbadfit=optiondict["zerooutbadfit"],
     )
 
+    # the index of the global maximum of the similarity function in each voxel
+    globalmaxbuf = np.zeros(numvalidspatiallocs, dtype=np.int32)
+
+    # host side staging buffer for the prepared timecourses that the GPU pass uploads
+    if optiondict["usegpu"]:
+        gpupreptcbuf = np.zeros(
+            (numvalidspatiallocs, len(os_fmri_x[osvalidsimcalcstart : osvalidsimcalcend + 1])),
+            dtype=rt_floattype,
+        )
+    else:
+        gpupreptcbuf = None
+
     # Preprocessing - echo cancellation
     if optiondict["echocancel"]:
         LGR.info("\n\nEcho cancellation")
@@ -1807,37 +1871,38 @@ def rapidtide_main(argparsingfunc):
             windowfunc=optiondict["windowfunc"],
         )
 
-        disablemkl(optiondict["nprocs_calcsimilarity"], debug=threaddebug)
-        (
-            voxelsprocessed_echo,
-            theglobalmaxlist,
-            trimmedcorrscale,
-        ) = calcsimilaritypass_func(
-            fmri_data_valid[:, validsimcalcstart : validsimcalcend + 1],
-            referencetc,
-            theCorrelator,
-            initial_fmri_x[validsimcalcstart : validsimcalcend + 1],
-            os_fmri_x[osvalidsimcalcstart : osvalidsimcalcend + 1],
-            lagmininpts,
-            lagmaxinpts,
-            corrout,
-            meanval,
-            nprocs=optiondict["nprocs_calcsimilarity"],
-            alwaysmultiproc=optiondict["alwaysmultiproc"],
-            oversampfactor=optiondict["oversampfactor"],
-            interptype=optiondict["interptype"],
-            showprogressbar=optiondict["showprogressbar"],
-            chunksize=optiondict["mp_chunksize"],
-            rt_floatset=rt_floatset,
-            rt_floattype=rt_floattype,
-        )
-        enablemkl(optiondict["mklthreads"], debug=threaddebug)
+        with mklsuspended(
+            optiondict["nprocs_calcsimilarity"], optiondict["mklthreads"], debug=threaddebug
+        ):
+            (
+                voxelsprocessed_echo,
+                theglobalmaxlist,
+                trimmedcorrscale,
+            ) = calcsimilaritypass_func(
+                fmri_data_valid[:, validsimcalcstart : validsimcalcend + 1],
+                referencetc,
+                theCorrelator,
+                initial_fmri_x[validsimcalcstart : validsimcalcend + 1],
+                os_fmri_x[osvalidsimcalcstart : osvalidsimcalcend + 1],
+                lagmininpts,
+                lagmaxinpts,
+                corrout,
+                meanval,
+                nprocs=optiondict["nprocs_calcsimilarity"],
+                alwaysmultiproc=optiondict["alwaysmultiproc"],
+                oversampfactor=optiondict["oversampfactor"],
+                interptype=optiondict["interptype"],
+                showprogressbar=optiondict["showprogressbar"],
+                chunksize=optiondict["mp_chunksize"],
+                globalmaxout=globalmaxbuf,
+                rt_floatset=rt_floatset,
+                rt_floattype=rt_floattype,
+            )
 
-        for i in range(len(theglobalmaxlist)):
-            theglobalmaxlist[i] = corrscale[theglobalmaxlist[i]] - optiondict["simcalcoffset"]
+        theglobalmaxlist = corrscale[theglobalmaxlist] - optiondict["simcalcoffset"]
         namesuffix = "_desc-globallag_hist"
         tide_stats.makeandsavehistogram(
-            np.asarray(theglobalmaxlist),
+            theglobalmaxlist,
             len(corrscale),
             0,
             outputname + namesuffix,
@@ -1850,7 +1915,7 @@ def rapidtide_main(argparsingfunc):
         )
 
         # Now find and regress out the echo
-        echooffset, echoratio = tide_stats.echoloc(np.asarray(theglobalmaxlist), len(corrscale))
+        echooffset, echoratio = tide_stats.echoloc(theglobalmaxlist, len(corrscale))
         LGR.info(f"Echooffset, echoratio: {echooffset} {echoratio}")
         echoremovedtc, echofit, echoR2 = echocancel(
             resampref_y, echooffset, oversamptr, outputname, numpadtrs
@@ -1869,13 +1934,20 @@ def rapidtide_main(argparsingfunc):
         )
 
     # --------------------- Main pass loop ---------------------
+    # sidelobe notch filters, keyed by stop frequency, reused across passes
+    acfixfilters = {}
+
+    # the despeckling neighborhood of each valid voxel doesn't change, so find it once
+    if optiondict["despeckle_passes"] > 0:
+        despeckleneighbors = tide_filt.getneighborhoodindices(nativespaceshape, validvoxels)
+
     # loop over all passes
     stoprefining = False
     refinestopreason = "passesreached"
     if optiondict["convergencethresh"] is None:
         numpasses = optiondict["passes"]
     else:
-        numpasses = np.max([optiondict["passes"], optiondict["maxpasses"]])
+        numpasses = max(optiondict["passes"], optiondict["maxpasses"])
 
     # write out the current version of the run options
     optiondict["currentstage"] = "preprocessingdone"
@@ -1884,11 +1956,32 @@ def rapidtide_main(argparsingfunc):
     ####################################################
     #  Start the iterative fit and refinement
     ####################################################
+    # per-pass timecourse outputs are written in the background so the next step can start
+    # right away.  A single worker keeps appends to the same file in order.
+    iopool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    iofutures = []
+
+    # the per-pass 3D maps all use the same header, so make it once here rather than every
+    # pass.  savetonifti sets the datatype fields of the header it is given, so the saves
+    # queued on the single iopool worker can share it, but anything written from the main thread
+    # while they may still be running has to use its own copy.
+    if not optiondict["textio"]:
+        passmapheader = nim_hdr.copy()
+        if fileiscifti:
+            timeindex = passmapheader["dim"][0] - 1
+            spaceindex = passmapheader["dim"][0]
+            passmapheader["dim"][timeindex] = 1
+            passmapheader["dim"][spaceindex] = numspatiallocs
+        else:
+            passmapheader["dim"][0] = 3
+            passmapheader["dim"][4] = 1
+            passmapheader["pixdim"][4] = 1.0
     for thepass in range(1, numpasses + 1):
         if stoprefining:
             break
 
         # initialize the pass
+        passsuffix = f"_pass{thepass}"
         if optiondict["passes"] > 1:
             LGR.info("\n\n*********************")
             LGR.info(f"Pass number {thepass}")
@@ -1940,35 +2033,26 @@ def rapidtide_main(argparsingfunc):
             )
 
             # save
-            tide_io.writebidstsv(
-                f"{outputname}_desc-regressornoiseremoval_timeseries",
-                shiftednoise,
-                1.0 / oversamptr,
-                starttime=0.0,
-                columns=[f"shiftednoise_pass{thepass}"],
-                append=(thepass > 1),
-            )
-            tide_io.writebidstsv(
-                f"{outputname}_desc-regressornoiseremoval_timeseries",
-                datatoremove,
-                1.0 / oversamptr,
-                starttime=0.0,
-                columns=[f"removed_pass{thepass}"],
-                append=True,
-            )
-            tide_io.writebidstsv(
-                f"{outputname}_desc-regressornoiseremoval_timeseries",
-                resampref_y,
-                1.0 / oversamptr,
-                starttime=0.0,
-                columns=[f"filtered_pass{thepass}"],
-                append=True,
+            iofutures.append(
+                iopool.submit(
+                    tide_io.writebidstsv,
+                    f"{outputname}_desc-regressornoiseremoval_timeseries",
+                    np.vstack((shiftednoise, datatoremove, resampref_y)),
+                    1.0 / oversamptr,
+                    starttime=0.0,
+                    columns=[
+                        f"shiftednoise_pass{thepass}",
+                        f"removed_pass{thepass}",
+                        f"filtered_pass{thepass}",
+                    ],
+                    append=(thepass > 1),
+                )
             )
 
         if optiondict["check_autocorrelation"]:
             LGR.info("checking reference regressor autocorrelation properties")
             optiondict["lagmod"] = 1000.0
-            lagindpad = corrorigin - 2 * np.max((lagmininpts, lagmaxinpts))
+            lagindpad = corrorigin - 2 * max(lagmininpts, lagmaxinpts)
             acmininpts = lagmininpts + lagindpad
             acmaxinpts = lagmaxinpts + lagindpad
             theCorrelator.setreftc(referencetc)
@@ -2006,7 +2090,7 @@ def rapidtide_main(argparsingfunc):
                 columns=[f"pass{thepass}"],
                 append=(thepass > 1),
             )
-            thelagthresh = np.max((abs(optiondict["lagmin"]), abs(optiondict["lagmax"])))
+            thelagthresh = max(abs(optiondict["lagmin"]), abs(optiondict["lagmax"]))
             theampthresh = 0.1
             LGR.info(
                 f"searching for sidelobes with amplitude > {theampthresh} "
@@ -2021,11 +2105,10 @@ def rapidtide_main(argparsingfunc):
             )
             optiondict["acwidth"] = acwidth + 0.0
             optiondict["absmaxsigma"] = acwidth * 10.0
-            passsuffix = "_pass" + str(thepass)
             if sidelobetime is not None:
                 optiondict["acsidelobelag" + passsuffix] = sidelobetime
-                optiondict["despeckle_thresh"] = np.max(
-                    [optiondict["despeckle_thresh"], sidelobetime / 2.0]
+                optiondict["despeckle_thresh"] = max(
+                    optiondict["despeckle_thresh"], sidelobetime / 2.0
                 )
                 optiondict["acsidelobeamp" + passsuffix] = sidelobeamp
                 LGR.warning(
@@ -2052,16 +2135,22 @@ def rapidtide_main(argparsingfunc):
                     if doreferencenotch:
                         LGR.info("removing spectral component at sidelobe frequency")
                         acstopfreq = 1.0 / sidelobetime
-                        acfixfilter = tide_filt.NoncausalFilter(
-                            debug=optiondict["debug"],
-                        )
-                        acfixfilter.settype("arb_stop")
-                        acfixfilter.setfreqs(
-                            acstopfreq * 0.9,
-                            acstopfreq * 0.95,
-                            acstopfreq * 1.05,
-                            acstopfreq * 1.1,
-                        )
+                        # the sidelobe rarely moves between passes, so reuse the filter if we can
+                        acfixkey = round(acstopfreq, 4)
+                        if acfixkey in acfixfilters:
+                            acfixfilter = acfixfilters[acfixkey]
+                        else:
+                            acfixfilter = tide_filt.NoncausalFilter(
+                                debug=optiondict["debug"],
+                            )
+                            acfixfilter.settype("arb_stop")
+                            acfixfilter.setfreqs(
+                                acstopfreq * 0.9,
+                                acstopfreq * 0.95,
+                                acstopfreq * 1.05,
+                                acstopfreq * 1.1,
+                            )
+                            acfixfilters[acfixkey] = acfixfilter
                         cleaned_resampref_y = tide_math.corrnormalize(
                             acfixfilter.apply(1.0 / oversamptr, resampref_y),
                             windowfunc="None",
@@ -2161,53 +2250,65 @@ def rapidtide_main(argparsingfunc):
                 theSimFunc = theMutualInformationator
             else:
                 theSimFunc = theCorrelator
-            disablemkl(optiondict["nprocs_getNullDist"], debug=threaddebug)
-            simdistdata = getNullDistributionData_func(
-                cleaned_resampref_y,
-                oversampfreq,
-                theSimFunc,
-                thefitter,
-                numestreps=optiondict["numestreps"],
-                nprocs=optiondict["nprocs_getNullDist"],
-                alwaysmultiproc=optiondict["alwaysmultiproc"],
-                showprogressbar=optiondict["showprogressbar"],
-                chunksize=optiondict["mp_chunksize"],
-                permutationmethod=optiondict["permutationmethod"],
-                fixdelay=optiondict["fixdelay"],
-                rt_floatset=np.float64,
-                rt_floattype="float64",
-            )
-            enablemkl(optiondict["mklthreads"], debug=threaddebug)
+            with mklsuspended(
+                optiondict["nprocs_getNullDist"], optiondict["mklthreads"], debug=threaddebug
+            ):
+                simdistdata = getNullDistributionData_func(
+                    cleaned_resampref_y,
+                    oversampfreq,
+                    theSimFunc,
+                    thefitter,
+                    numestreps=optiondict["numestreps"],
+                    nprocs=optiondict["nprocs_getNullDist"],
+                    alwaysmultiproc=optiondict["alwaysmultiproc"],
+                    showprogressbar=optiondict["showprogressbar"],
+                    chunksize=optiondict["mp_chunksize"],
+                    permutationmethod=optiondict["permutationmethod"],
+                    fixdelay=optiondict["fixdelay"],
+                    rt_floatset=rt_floatset,
+                    rt_floattype=rt_floattype,
+                )
 
-            tide_io.writebidstsv(
-                f"{outputname}_desc-simdistdata_info",
-                simdistdata,
-                1.0,
-                columns=["pass" + str(thepass)],
-                extraheaderinfo={"Description": "Individual sham correlation datapoints"},
-                append=(thepass > 1),
+            iofutures.append(
+                iopool.submit(
+                    tide_io.writebidstsv,
+                    f"{outputname}_desc-simdistdata_info",
+                    simdistdata,
+                    1.0,
+                    columns=["pass" + str(thepass)],
+                    extraheaderinfo={"Description": "Individual sham correlation datapoints"},
+                    append=(thepass > 1),
+                )
             )
+            # the sham correlations are generated at working precision, but the outlier removal and
+            # distribution fits are sensitive to roundoff, so do those in double precision
             cleansimdistdata, nullmedian, nullmad = tide_math.removeoutliers(
-                simdistdata, zerobad=True, outlierfac=optiondict["sigdistoutlierfac"]
+                simdistdata.astype(np.float64),
+                zerobad=True,
+                outlierfac=optiondict["sigdistoutlierfac"],
             )
             optiondict[f"nullmedian_pass{thepass}"] = nullmedian + 0.0
             optiondict[f"nullmad_pass{thepass}"] = nullmad + 0.0
-            tide_io.writebidstsv(
-                f"{outputname}_desc-cleansimdistdata_info",
-                cleansimdistdata,
-                1.0,
-                columns=["pass" + str(thepass)],
-                extraheaderinfo={
-                    "Description": "Individual sham correlation datapoints after outlier removal"
-                },
-                append=(thepass > 1),
+            iofutures.append(
+                iopool.submit(
+                    tide_io.writebidstsv,
+                    f"{outputname}_desc-cleansimdistdata_info",
+                    cleansimdistdata,
+                    1.0,
+                    columns=["pass" + str(thepass)],
+                    extraheaderinfo={
+                        "Description": "Individual sham correlation datapoints after outlier removal"
+                    },
+                    append=(thepass > 1),
+                )
             )
 
             # calculate percentiles for the crosscorrelation from the distribution data
             thepercentiles = np.array([0.95, 0.99, 0.995, 0.999])
-            thepvalnames = []
-            for thispercentile in thepercentiles:
-                thepvalnames.append("{:.3f}".format(1.0 - thispercentile).replace(".", "p"))
+            thepvalnames = [
+                f"{1.0 - thispercentile:.3f}".replace(".", "p")
+                for thispercentile in thepercentiles
+            ]
 
             pcts, pcts_fit, sigfit = tide_stats.sigFromDistributionData(
                 cleansimdistdata,
@@ -2220,13 +2321,9 @@ def rapidtide_main(argparsingfunc):
             )
             if pcts is not None:
                 for i in range(len(thepvalnames)):
-                    optiondict[
-                        "p_lt_" + thepvalnames[i] + "_pass" + str(thepass) + "_thresh.txt"
-                    ] = pcts[i]
+                    optiondict[f"p_lt_{thepvalnames[i]}{passsuffix}_thresh.txt"] = pcts[i]
                     if optiondict["dosighistfit"]:
-                        optiondict[
-                            "p_lt_" + thepvalnames[i] + "_pass" + str(thepass) + "_fitthresh"
-                        ] = pcts_fit[i]
+                        optiondict[f"p_lt_{thepvalnames[i]}{passsuffix}_fitthresh"] = pcts_fit[i]
                         optiondict["sigfit"] = sigfit
                 if optiondict["ampthreshfromsig"]:
                     if pcts is not None:
@@ -2274,7 +2371,8 @@ def rapidtide_main(argparsingfunc):
 
         # write out the current version of the run options
         optiondict["currentstage"] = f"precorrelation_pass{thepass}"
-        tide_io.writedicttojson(optiondict, f"{outputname}_desc-runoptions_info.json")
+        if optiondict["checkpoint"]:
+            tide_io.writedicttojson(optiondict, f"{outputname}_desc-runoptions_info.json")
 
         # Step 1 - Correlation step
         if optiondict["similaritymetric"] == "mutualinfo":
@@ -2291,63 +2389,91 @@ def rapidtide_main(argparsingfunc):
             "before correlationpass",
         )
 
-        disablemkl(optiondict["nprocs_calcsimilarity"], debug=threaddebug)
-        if optiondict["similaritymetric"] == "mutualinfo":
-            theMutualInformationator.setlimits(lagmininpts, lagmaxinpts)
-            (
-                voxelsprocessed_cp,
-                theglobalmaxlist,
-                trimmedcorrscale,
-            ) = calcsimilaritypass_func(
-                fmri_data_valid[:, validsimcalcstart : validsimcalcend + 1],
-                cleaned_referencetc,
-                theMutualInformationator,
-                initial_fmri_x[validsimcalcstart : validsimcalcend + 1],
-                os_fmri_x[osvalidsimcalcstart : osvalidsimcalcend + 1],
-                lagmininpts,
-                lagmaxinpts,
-                corrout,
-                meanval,
-                nprocs=optiondict["nprocs_calcsimilarity"],
-                alwaysmultiproc=optiondict["alwaysmultiproc"],
-                oversampfactor=optiondict["oversampfactor"],
-                interptype=optiondict["interptype"],
-                showprogressbar=optiondict["showprogressbar"],
-                chunksize=optiondict["mp_chunksize"],
-                rt_floatset=rt_floatset,
-                rt_floattype=rt_floattype,
-            )
-        else:
-            (
-                voxelsprocessed_cp,
-                theglobalmaxlist,
-                trimmedcorrscale,
-            ) = calcsimilaritypass_func(
-                fmri_data_valid[:, validsimcalcstart : validsimcalcend + 1],
-                cleaned_referencetc,
-                theCorrelator,
-                initial_fmri_x[validsimcalcstart : validsimcalcend + 1],
-                os_fmri_x[osvalidsimcalcstart : osvalidsimcalcend + 1],
-                lagmininpts,
-                lagmaxinpts,
-                corrout,
-                meanval,
-                nprocs=optiondict["nprocs_calcsimilarity"],
-                alwaysmultiproc=optiondict["alwaysmultiproc"],
-                oversampfactor=optiondict["oversampfactor"],
-                interptype=optiondict["interptype"],
-                showprogressbar=optiondict["showprogressbar"],
-                chunksize=optiondict["mp_chunksize"],
-                rt_floatset=rt_floatset,
-                rt_floattype=rt_floattype,
-            )
-        enablemkl(optiondict["mklthreads"], debug=threaddebug)
+        with mklsuspended(
+            optiondict["nprocs_calcsimilarity"], optiondict["mklthreads"], debug=threaddebug
+        ):
+            if optiondict["similaritymetric"] == "mutualinfo":
+                theMutualInformationator.setlimits(lagmininpts, lagmaxinpts)
+                (
+                    voxelsprocessed_cp,
+                    theglobalmaxlist,
+                    trimmedcorrscale,
+                ) = calcsimilaritypass_func(
+                    fmri_data_valid[:, validsimcalcstart : validsimcalcend + 1],
+                    cleaned_referencetc,
+                    theMutualInformationator,
+                    initial_fmri_x[validsimcalcstart : validsimcalcend + 1],
+                    os_fmri_x[osvalidsimcalcstart : osvalidsimcalcend + 1],
+                    lagmininpts,
+                    lagmaxinpts,
+                    corrout,
+                    meanval,
+                    nprocs=optiondict["nprocs_calcsimilarity"],
+                    alwaysmultiproc=optiondict["alwaysmultiproc"],
+                    oversampfactor=optiondict["oversampfactor"],
+                    interptype=optiondict["interptype"],
+                    showprogressbar=optiondict["showprogressbar"],
+                    chunksize=optiondict["mp_chunksize"],
+                    globalmaxout=globalmaxbuf,
+                    rt_floatset=rt_floatset,
+                    rt_floattype=rt_floattype,
+                )
+            elif optiondict["usegpu"]:
+                (
+                    voxelsprocessed_cp,
+                    theglobalmaxlist,
+                    trimmedcorrscale,
+                ) = tide_calcsimfunc.correlationpass_gpu(
+                    fmri_data_valid[:, validsimcalcstart : validsimcalcend + 1],
+                    cleaned_referencetc,
+                    theCorrelator,
+                    initial_fmri_x[validsimcalcstart : validsimcalcend + 1],
+                    os_fmri_x[osvalidsimcalcstart : osvalidsimcalcend + 1],
+                    lagmininpts,
+                    lagmaxinpts,
+                    corrout,
+                    meanval,
+                    nprocs=optiondict["nprocs_calcsimilarity"],
+                    alwaysmultiproc=optiondict["alwaysmultiproc"],
+                    oversampfactor=optiondict["oversampfactor"],
+                    interptype=optiondict["interptype"],
+                    showprogressbar=optiondict["showprogressbar"],
+                    chunksize=optiondict["mp_chunksize"],
+                    globalmaxout=globalmaxbuf,
+                    preptcbuf=gpupreptcbuf,
+                    rt_floatset=rt_floatset,
+                    rt_floattype=rt_floattype,
+                )
+            else:
+                (
+                    voxelsprocessed_cp,
+                    theglobalmaxlist,
+                    trimmedcorrscale,
+                ) = calcsimilaritypass_func(
+                    fmri_data_valid[:, validsimcalcstart : validsimcalcend + 1],
+                    cleaned_referencetc,
+                    theCorrelator,
+                    initial_fmri_x[validsimcalcstart : validsimcalcend + 1],
+                    os_fmri_x[osvalidsimcalcstart : osvalidsimcalcend + 1],
+                    lagmininpts,
+                    lagmaxinpts,
+                    corrout,
+                    meanval,
+                    nprocs=optiondict["nprocs_calcsimilarity"],
+                    alwaysmultiproc=optiondict["alwaysmultiproc"],
+                    oversampfactor=optiondict["oversampfactor"],
+                    interptype=optiondict["interptype"],
+                    showprogressbar=optiondict["showprogressbar"],
+                    chunksize=optiondict["mp_chunksize"],
+                    globalmaxout=globalmaxbuf,
+                    rt_floatset=rt_floatset,
+                    rt_floattype=rt_floattype,
+                )
 
-        for i in range(len(theglobalmaxlist)):
-            theglobalmaxlist[i] = corrscale[theglobalmaxlist[i]] - optiondict["simcalcoffset"]
+        theglobalmaxlist = corrscale[theglobalmaxlist] - optiondict["simcalcoffset"]
         namesuffix = "_desc-globallag_hist"
         tide_stats.makeandsavehistogram(
-            np.asarray(theglobalmaxlist),
+            theglobalmaxlist,
             len(corrscale),
             0,
             outputname + namesuffix,
@@ -2360,7 +2486,7 @@ def rapidtide_main(argparsingfunc):
         )
 
         if optiondict["checkpoint"]:
-            outcorrarray[:, :] = 0.0
+            # only the valid voxel rows are ever written, so there is no need to clear the array
             outcorrarray[validvoxels, :] = corrout[:, :]
             if optiondict["textio"]:
                 tide_io.writenpvecs(
@@ -2369,7 +2495,11 @@ def rapidtide_main(argparsingfunc):
                 )
             else:
                 savename = f"{outputname}_desc-corroutprefit_pass-" + str(thepass)
-                tide_io.savetonifti(outcorrarray.reshape(nativecorrshape), theheader, savename)
+                # from the second pass on theheader is passmapheader, which the iopool worker may
+                # be writing with, so this save gets its own copy
+                tide_io.savetonifti(
+                    outcorrarray.reshape(nativecorrshape), copyheader(theheader), savename
+                )
 
         TimingLGR.info(
             f"{similaritytype} calculation end, pass {thepass}",
@@ -2389,26 +2519,29 @@ def rapidtide_main(argparsingfunc):
                 "before peakevalpass",
             )
 
-            disablemkl(optiondict["nprocs_peakeval"], debug=threaddebug)
-            voxelsprocessed_pe, thepeakdict = peakevalpass_func(
-                fmri_data_valid[:, validsimcalcstart : validsimcalcend + 1],
-                cleaned_referencetc,
-                initial_fmri_x[validsimcalcstart : validsimcalcend + 1],
-                os_fmri_x[osvalidsimcalcstart : osvalidsimcalcend + 1],
-                theMutualInformationator,
-                trimmedcorrscale,
-                corrout,
-                nprocs=optiondict["nprocs_peakeval"],
-                alwaysmultiproc=optiondict["alwaysmultiproc"],
-                bipolar=optiondict["bipolar"],
-                oversampfactor=optiondict["oversampfactor"],
-                interptype=optiondict["interptype"],
-                showprogressbar=optiondict["showprogressbar"],
-                chunksize=optiondict["mp_chunksize"],
-                rt_floatset=rt_floatset,
-                rt_floattype=rt_floattype,
-            )
-            enablemkl(optiondict["mklthreads"], debug=threaddebug)
+            mipeaks = np.zeros_like(lagtimes)
+            with mklsuspended(
+                optiondict["nprocs_peakeval"], optiondict["mklthreads"], debug=threaddebug
+            ):
+                voxelsprocessed_pe, thepeakdict = peakevalpass_func(
+                    fmri_data_valid[:, validsimcalcstart : validsimcalcend + 1],
+                    cleaned_referencetc,
+                    initial_fmri_x[validsimcalcstart : validsimcalcend + 1],
+                    os_fmri_x[osvalidsimcalcstart : osvalidsimcalcend + 1],
+                    theMutualInformationator,
+                    trimmedcorrscale,
+                    corrout,
+                    nprocs=optiondict["nprocs_peakeval"],
+                    alwaysmultiproc=optiondict["alwaysmultiproc"],
+                    bipolar=optiondict["bipolar"],
+                    oversampfactor=optiondict["oversampfactor"],
+                    interptype=optiondict["interptype"],
+                    showprogressbar=optiondict["showprogressbar"],
+                    chunksize=optiondict["mp_chunksize"],
+                    peaklagout=mipeaks,
+                    rt_floatset=rt_floatset,
+                    rt_floattype=rt_floattype,
+                )
 
             TimingLGR.info(
                 f"Peak prefit end, pass {thepass}",
@@ -2417,33 +2550,23 @@ def rapidtide_main(argparsingfunc):
                     "message3": "voxels",
                 },
             )
-            mipeaks = lagtimes * 0.0
-            for i in range(numvalidspatiallocs):
-                if len(thepeakdict[str(i)]) > 0:
-                    mipeaks[i] = thepeakdict[str(i)][0][0]
         else:
             thepeakdict = None
 
         # Step 2 - similarity function fitting and time lag estimation
         # write out the current version of the run options
         optiondict["currentstage"] = f"presimfuncfit_pass{thepass}"
-        tide_io.writedicttojson(optiondict, f"{outputname}_desc-runoptions_info.json")
+        if optiondict["checkpoint"]:
+            tide_io.writedicttojson(optiondict, f"{outputname}_desc-runoptions_info.json")
         LGR.info(f"\n\nTime lag estimation pass {thepass}")
         TimingLGR.info(f"Time lag estimation start, pass {thepass}")
-        fitcorr_func = addmemprofiling(
-            tide_simfuncfit.fitcorr, optiondict["memprofile"], "before fitcorr"
-        )
         thefitter.setfunctype(optiondict["similaritymetric"])
         thefitter.setcorrtimeaxis(trimmedcorrscale)
 
-        # use initial lags if this is a hybrid fit
-        if optiondict["similaritymetric"] == "hybrid" and thepeakdict is not None:
-            initlags = mipeaks
-        else:
-            initlags = None
-
-        disablemkl(optiondict["nprocs_fitcorr"], debug=threaddebug)
-        voxelsprocessed_fc = fitcorr_func(
+        # the arrays and options are the same for the initial fit and all of the despeckling
+        # subpasses, so bind them once
+        fitcorr_func = functools.partial(
+            addmemprofiling(tide_simfuncfit.fitcorr, optiondict["memprofile"], "before fitcorr"),
             trimmedcorrscale,
             thefitter,
             corrout,
@@ -2455,7 +2578,6 @@ def rapidtide_main(argparsingfunc):
             gaussout,
             windowout,
             R2,
-            despeckling=False,
             peakdict=thepeakdict,
             nprocs=optiondict["nprocs_fitcorr"],
             alwaysmultiproc=optiondict["alwaysmultiproc"],
@@ -2464,11 +2586,20 @@ def rapidtide_main(argparsingfunc):
             showprogressbar=optiondict["showprogressbar"],
             chunksize=optiondict["mp_chunksize"],
             despeckle_thresh=optiondict["despeckle_thresh"],
-            initiallags=initlags,
             rt_floatset=rt_floatset,
             rt_floattype=rt_floattype,
         )
-        enablemkl(optiondict["mklthreads"], debug=threaddebug)
+
+        # use initial lags if this is a hybrid fit
+        if optiondict["similaritymetric"] == "hybrid" and thepeakdict is not None:
+            initlags = mipeaks
+        else:
+            initlags = None
+
+        with mklsuspended(
+            optiondict["nprocs_fitcorr"], optiondict["mklthreads"], debug=threaddebug
+        ):
+            voxelsprocessed_fc = fitcorr_func(despeckling=False, initiallags=initlags)
 
         TimingLGR.info(
             f"Time lag estimation end, pass {thepass}",
@@ -2486,91 +2617,42 @@ def rapidtide_main(argparsingfunc):
 
             # find lags that are very different from their neighbors, and refit starting at the median lag for the point
             voxelsprocessed_fc_ds = 0
-            despecklingdone = False
             lastnumdespeckled = 1000000
             for despecklepass in range(optiondict["despeckle_passes"]):
                 LGR.info(f"\n\n{similaritytype} despeckling subpass {despecklepass + 1}")
-                outmaparray *= 0.0
-                outmaparray[validvoxels] = eval("lagtimes")[:]
-
-                # find voxels to despeckle
-                medianlags = ndimage.median_filter(
-                    outmaparray.reshape(nativespaceshape), 3
-                ).reshape(numspatiallocs)
-                # voxels that we're happy with have initlags set to -1000000.0
-                initlags = np.where(
-                    np.abs(outmaparray - medianlags) > optiondict["despeckle_thresh"],
-                    medianlags,
-                    -1000000.0,
-                )[validvoxels]
-
-                if len(initlags) > 0:
-                    numdespeckled = len(np.where(initlags != -1000000.0)[0])
-                    if lastnumdespeckled > numdespeckled > 0:
-                        lastnumdespeckled = numdespeckled
-                        disablemkl(optiondict["nprocs_fitcorr"], debug=threaddebug)
-                        voxelsprocessed_thispass = fitcorr_func(
-                            trimmedcorrscale,
-                            thefitter,
-                            corrout,
-                            fitmask,
-                            failreason,
-                            lagtimes,
-                            lagstrengths,
-                            lagsigma,
-                            gaussout,
-                            windowout,
-                            R2,
-                            despeckling=True,
-                            peakdict=thepeakdict,
-                            nprocs=optiondict["nprocs_fitcorr"],
-                            alwaysmultiproc=optiondict["alwaysmultiproc"],
-                            fixdelay=optiondict["fixdelay"],
-                            initialdelayvalue=theinitialdelay,
-                            showprogressbar=optiondict["showprogressbar"],
-                            chunksize=optiondict["mp_chunksize"],
-                            despeckle_thresh=optiondict["despeckle_thresh"],
-                            initiallags=initlags,
-                            rt_floatset=rt_floatset,
-                            rt_floattype=rt_floattype,
-                        )
-                        enablemkl(optiondict["mklthreads"], debug=threaddebug)
-
-                        voxelsprocessed_fc_ds += voxelsprocessed_thispass
-                        optiondict[
-                            "despecklemasksize_pass" + str(thepass) + "_d" + str(despecklepass + 1)
-                        ] = voxelsprocessed_thispass
-                        optiondict[
-                            "despecklemaskpct_pass" + str(thepass) + "_d" + str(despecklepass + 1)
-                        ] = (100.0 * voxelsprocessed_thispass / optiondict["corrmasksize"])
-                    else:
-                        despecklingdone = True
-                else:
-                    despecklingdone = True
-                if despecklingdone:
+                # only the valid voxels are ever written, so the rest of the array stays zero
+                outmaparray[validvoxels] = lagtimes
+
+                # find voxels to despeckle - only the valid voxels need the median
+                medianlags = tide_filt.neighborhoodmedian(outmaparray, despeckleneighbors)
+                despecklelocs = np.abs(lagtimes - medianlags) > optiondict["despeckle_thresh"]
+                numdespeckled = np.count_nonzero(despecklelocs)
+                if not (lastnumdespeckled > numdespeckled > 0):
                     LGR.info("Nothing left to do! Terminating despeckling")
                     break
+                lastnumdespeckled = numdespeckled
 
-            internaldespeckleincludemask = np.where(
-                np.abs(outmaparray - medianlags) > optiondict["despeckle_thresh"],
-                medianlags,
-                0.0,
-            )
+                # voxels that we're happy with have initlags set to -1000000.0
+                initlags = np.where(despecklelocs, medianlags, -1000000.0)
+                with mklsuspended(
+                    optiondict["nprocs_fitcorr"], optiondict["mklthreads"], debug=threaddebug
+                ):
+                    voxelsprocessed_thispass = fitcorr_func(despeckling=True, initiallags=initlags)
+
+                voxelsprocessed_fc_ds += voxelsprocessed_thispass
+                optiondict[
+                    "despecklemasksize_pass" + str(thepass) + "_d" + str(despecklepass + 1)
+                ] = voxelsprocessed_thispass
+                optiondict[
+                    "despecklemaskpct_pass" + str(thepass) + "_d" + str(despecklepass + 1)
+                ] = (100.0 * voxelsprocessed_thispass / optiondict["corrmasksize"])
+
+            internaldespeckleincludemask_valid = np.where(despecklelocs, medianlags, 0.0)
             if optiondict["savedespecklemasks"] and (optiondict["despeckle_passes"] > 0):
-                despecklesavemask = np.where(
-                    internaldespeckleincludemask[validvoxels] == 0.0, 0, 1
-                )
+                despecklesavemask = np.where(internaldespeckleincludemask_valid == 0.0, 0, 1)
                 if thepass == optiondict["passes"]:
                     if not optiondict["textio"]:
-                        if fileiscifti:
-                            timeindex = theheader["dim"][0] - 1
-                            spaceindex = theheader["dim"][0]
-                            theheader["dim"][timeindex] = 1
-                            theheader["dim"][spaceindex] = numspatiallocs
-                        else:
-                            theheader["dim"][0] = 3
-                            theheader["dim"][4] = 1
-                            theheader["pixdim"][4] = 1.0
+                        theheader = passmapheader
                     masklist = [
                         (
                             despecklesavemask,
@@ -2580,17 +2662,20 @@ def rapidtide_main(argparsingfunc):
                             "Voxels that underwent despeckling in the final pass",
                         )
                     ]
-                    tide_io.savemaplist(
-                        outputname,
-                        masklist,
-                        validvoxels,
-                        nativespaceshape,
-                        theheader,
-                        bidsbasedict,
-                        textio=optiondict["textio"],
-                        fileiscifti=fileiscifti,
-                        rt_floattype=rt_floattype,
-                        cifti_hdr=cifti_hdr,
+                    iofutures.append(
+                        iopool.submit(
+                            tide_io.savemaplist,
+                            outputname,
+                            masklist,
+                            validvoxels,
+                            nativespaceshape,
+                            theheader,
+                            bidsbasedict,
+                            textio=optiondict["textio"],
+                            fileiscifti=fileiscifti,
+                            rt_floattype=rt_floattype,
+                            cifti_hdr=cifti_hdr,
+                        )
                     )
             LGR.info(
                 f"\n\n{voxelsprocessed_fc_ds} voxels despeckled in "
@@ -2606,8 +2691,7 @@ def rapidtide_main(argparsingfunc):
 
         # Step 2c - patch shifting
         if optiondict["patchshift"]:
-            outmaparray *= 0.0
-            outmaparray[validvoxels] = eval("lagtimes")[:]
+            outmaparray[validvoxels] = lagtimes
             # new method
             masklist = [
                 (
@@ -2618,17 +2702,20 @@ def rapidtide_main(argparsingfunc):
                     f"Input lagtimes map prior to patch map generation pass {thepass}",
                 ),
             ]
-            tide_io.savemaplist(
-                outputname,
-                masklist,
-                validvoxels,
-                nativespaceshape,
-                theheader,
-                bidsbasedict,
-                textio=optiondict["textio"],
-                fileiscifti=fileiscifti,
-                rt_floattype=rt_floattype,
-                cifti_hdr=cifti_hdr,
+            iofutures.append(
+                iopool.submit(
+                    tide_io.savemaplist,
+                    outputname,
+                    masklist,
+                    validvoxels,
+                    nativespaceshape,
+                    theheader,
+                    bidsbasedict,
+                    textio=optiondict["textio"],
+                    fileiscifti=fileiscifti,
+                    rt_floattype=rt_floattype,
+                    cifti_hdr=cifti_hdr,
+                )
             )
 
             # create list of anomalous 3D regions that don't match surroundings
@@ -2651,17 +2738,20 @@ def rapidtide_main(argparsingfunc):
                         f"DoG map for pass {thepass}",
                     ),
                 ]
-                tide_io.savemaplist(
-                    outputname,
-                    masklist,
-                    validvoxels,
-                    nativespaceshape,
-                    theheader,
-                    bidsbasedict,
-                    textio=optiondict["textio"],
-                    fileiscifti=fileiscifti,
-                    rt_floattype=rt_floattype,
-                    cifti_hdr=cifti_hdr,
+                iofutures.append(
+                    iopool.submit(
+                        tide_io.savemaplist,
+                        outputname,
+                        masklist,
+                        validvoxels,
+                        nativespaceshape,
+                        theheader,
+                        bidsbasedict,
+                        textio=optiondict["textio"],
+                        fileiscifti=fileiscifti,
+                        rt_floattype=rt_floattype,
+                        cifti_hdr=cifti_hdr,
+                    )
                 )
                 step2 = tide_patch.invertedflood3D(
                     step1,
@@ -2676,17 +2766,20 @@ def rapidtide_main(argparsingfunc):
                         f"Inverted flood map for pass {thepass}",
                     ),
                 ]
-                tide_io.savemaplist(
-                    outputname,
-                    masklist,
-                    validvoxels,
-                    nativespaceshape,
-                    theheader,
-                    bidsbasedict,
-                    textio=optiondict["textio"],
-                    fileiscifti=fileiscifti,
-                    rt_floattype=rt_floattype,
-                    cifti_hdr=cifti_hdr,
+                iofutures.append(
+                    iopool.submit(
+                        tide_io.savemaplist,
+                        outputname,
+                        masklist,
+                        validvoxels,
+                        nativespaceshape,
+                        theheader,
+                        bidsbasedict,
+                        textio=optiondict["textio"],
+                        fileiscifti=fileiscifti,
+                        rt_floattype=rt_floattype,
+                        cifti_hdr=cifti_hdr,
+                    )
                 )
 
                 patchmap = tide_patch.separateclusters(
@@ -2712,42 +2805,35 @@ def rapidtide_main(argparsingfunc):
                         f"Patch map for despeckling pass {thepass}",
                     ),
                 ]
-                tide_io.savemaplist(
-                    outputname,
-                    masklist,
-                    validvoxels,
-                    nativespaceshape,
-                    theheader,
-                    bidsbasedict,
-                    textio=optiondict["textio"],
-                    fileiscifti=fileiscifti,
-                    rt_floattype=rt_floattype,
-                    cifti_hdr=cifti_hdr,
+                iofutures.append(
+                    iopool.submit(
+                        tide_io.savemaplist,
+                        outputname,
+                        masklist,
+                        validvoxels,
+                        nativespaceshape,
+                        theheader,
+                        bidsbasedict,
+                        textio=optiondict["textio"],
+                        fileiscifti=fileiscifti,
+                        rt_floattype=rt_floattype,
+                        cifti_hdr=cifti_hdr,
+                    )
                 )
 
             # now shift the patches to align with the majority of the image
             tide_patch.interppatch(lagtimes, patchmap[validvoxels])
 
-        # Step 2d - make a rank order map
-        timepercentile = (
-            100.0 * (rankdata(lagtimes, method="dense") - 1) / (numvalidspatiallocs - 1)
-        )
-
         if optiondict["saveintermediatemaps"]:
+            # Step 2d - make a rank order map
+            timepercentile = denserank(lagtimes).astype(np.float64)
+            timepercentile *= 100.0
+            timepercentile /= numvalidspatiallocs - 1
             if not optiondict["textio"]:
-                theheader = copy.deepcopy(nim_hdr)
-                if fileiscifti:
-                    timeindex = theheader["dim"][0] - 1
-                    spaceindex = theheader["dim"][0]
-                    theheader["dim"][timeindex] = 1
-                    theheader["dim"][spaceindex] = numspatiallocs
-                else:
-                    theheader["dim"][0] = 3
-                    theheader["dim"][4] = 1
-                    theheader["pixdim"][4] = 1.0
+                theheader = passmapheader
             bidspasssuffix = f"_intermediatedata-pass{thepass}"
             maplist = [
-                (lagtimes, "maxtime", "map", "second", "Lag time in seconds"),
+                (lagtimes.copy(), "maxtime", "map", "second", "Lag time in seconds"),
                 (
                     timepercentile,
                     "timepercentile",
@@ -2755,26 +2841,31 @@ def rapidtide_main(argparsingfunc):
                     "percent",
                     "Percentile ranking of this voxels delay",
                 ),
-                (lagstrengths, "maxcorr", "map", None, "Maximum correlation strength"),
-                (lagsigma, "maxwidth", "map", "second", "Width of corrrelation peak"),
+                (lagstrengths.copy(), "maxcorr", "map", None, "Maximum correlation strength"),
+                (lagsigma.copy(), "maxwidth", "map", "second", "Width of corrrelation peak"),
             ]
-            tide_io.savemaplist(
-                f"{outputname}{bidspasssuffix}",
-                maplist,
-                validvoxels,
-                nativespaceshape,
-                theheader,
-                bidsbasedict,
-                textio=optiondict["textio"],
-                fileiscifti=fileiscifti,
-                rt_floattype=rt_floattype,
-                cifti_hdr=cifti_hdr,
+            iofutures.append(
+                iopool.submit(
+                    tide_io.savemaplist,
+                    f"{outputname}{bidspasssuffix}",
+                    maplist,
+                    validvoxels,
+                    nativespaceshape,
+                    theheader,
+                    bidsbasedict,
+                    textio=optiondict["textio"],
+                    fileiscifti=fileiscifti,
+                    rt_floattype=rt_floattype,
+                    cifti_hdr=cifti_hdr,
+                    nthreads=optiondict["nprocs"],
+                )
             )
 
         # Step 3 - regressor refinement for next pass
         # write out the current version of the run options
         optiondict["currentstage"] = f"prerefine_pass{thepass}"
-        tide_io.writedicttojson(optiondict, f"{outputname}_desc-runoptions_info.json")
+        if optiondict["checkpoint"]:
+            tide_io.writedicttojson(optiondict, f"{outputname}_desc-runoptions_info.json")
         if (
             thepass < optiondict["passes"]
             or optiondict["convergencethresh"] is not None
@@ -2784,19 +2875,17 @@ def rapidtide_main(argparsingfunc):
             TimingLGR.info(f"Regressor refinement start, pass {thepass}")
             if optiondict["refineoffset"]:
                 # check that we won't end up excluding all voxels from offset calculation before accepting mask
-                offsetmask = np.uint16(fitmask)
-                if internaloffsetincludemask_valid is not None:
-                    offsetmask[np.where(internaloffsetincludemask_valid == 0)] = 0
-                if internaloffsetexcludemask_valid is not None:
-                    offsetmask[np.where(internaloffsetexcludemask_valid != 0.0)] = 0
+                np.copyto(offsetmask, fitmask)
+                if offsetexcludedvoxels is not None:
+                    offsetmask[offsetexcludedvoxels] = 0
                 if tide_stats.getmasksize(offsetmask) == 0:
                     LGR.warning(
                         "NB: cannot exclude voxels from offset calculation mask - including for this pass"
                     )
-                    offsetmask = fitmask
+                    np.copyto(offsetmask, fitmask)
 
                 peaklag, dummy, dummy = tide_stats.gethistprops(
-                    lagtimes[np.where(offsetmask > 0)],
+                    lagtimes[offsetmask > 0],
                     optiondict["histlen"],
                     pickleft=optiondict["pickleft"],
                     peakthresh=optiondict["pickleftthresh"],
@@ -2818,7 +2907,7 @@ def rapidtide_main(argparsingfunc):
                 if internalrefineexcludemask_valid is None:
                     # if there is currently no exclude mask, set exclude mask = despeckle mask
                     thisinternalrefineexcludemask_valid = np.where(
-                        internaldespeckleincludemask[validvoxels] == 0.0, 0, 1
+                        internaldespeckleincludemask_valid == 0.0, 0, 1
                     )
                 else:
                     # if there is a current exclude mask, add any voxels that are being despeckled
@@ -2826,15 +2915,15 @@ def rapidtide_main(argparsingfunc):
                         internalrefineexcludemask_valid > 0, 1, 0
                     )
                     thisinternalrefineexcludemask_valid[
-                        np.where(internaldespeckleincludemask[validvoxels] != 0.0)
+                        np.where(internaldespeckleincludemask_valid != 0.0)
                     ] = 1
 
                 # now check that we won't end up excluding all voxels from refinement before accepting mask
-                overallmask = np.uint16(fitmask)
+                np.copyto(overallmask, fitmask)
                 if internalrefineincludemask_valid is not None:
-                    overallmask[np.where(internalrefineincludemask_valid == 0)] = 0
+                    overallmask[internalrefineincludemask_valid == 0] = 0
                 if thisinternalrefineexcludemask_valid is not None:
-                    overallmask[np.where(thisinternalrefineexcludemask_valid != 0.0)] = 0
+                    overallmask[thisinternalrefineexcludemask_valid != 0.0] = 0
                 if tide_stats.getmasksize(overallmask) == 0:
                     LGR.warning(
                         "NB: cannot exclude despeckled voxels from refinement - including for this pass"
@@ -2880,27 +2969,28 @@ def rapidtide_main(argparsingfunc):
                 "before aligning voxel timecourses",
             )
             LGR.info("aligning timecourses")
-            disablemkl(optiondict["nprocs_refine"], debug=threaddebug)
-            voxelsprocessed_rra = alignvoxels_func(
-                fmri_data_valid,
-                fmritr,
-                shiftedtcs,
-                weights,
-                paddedshiftedtcs,
-                paddedweights,
-                lagtimes,
-                refinemask,
-                nprocs=optiondict["nprocs_refine"],
-                detrendorder=optiondict["detrendorder"],
-                offsettime=optiondict["offsettime"],
-                alwaysmultiproc=optiondict["alwaysmultiproc"],
-                showprogressbar=optiondict["showprogressbar"],
-                chunksize=optiondict["mp_chunksize"],
-                padtrs=numpadtrs,
-                rt_floatset=rt_floatset,
-                rt_floattype=rt_floattype,
-            )
-            enablemkl(optiondict["mklthreads"], debug=threaddebug)
+            with mklsuspended(
+                optiondict["nprocs_refine"], optiondict["mklthreads"], debug=threaddebug
+            ):
+                voxelsprocessed_rra = alignvoxels_func(
+                    fmri_data_valid,
+                    fmritr,
+                    shiftedtcs,
+                    weights,
+                    paddedshiftedtcs,
+                    paddedweights,
+                    lagtimes,
+                    refinemask,
+                    nprocs=optiondict["nprocs_refine"],
+                    detrendorder=optiondict["detrendorder"],
+                    offsettime=optiondict["offsettime"],
+                    alwaysmultiproc=optiondict["alwaysmultiproc"],
+                    showprogressbar=optiondict["showprogressbar"],
+                    chunksize=optiondict["mp_chunksize"],
+                    padtrs=numpadtrs,
+                    rt_floatset=rt_floatset,
+                    rt_floattype=rt_floattype,
+                )
             LGR.info(f"align complete: {voxelsprocessed_rra=}")
 
             LGR.info("prenormalizing timecourses")
@@ -2958,25 +3048,19 @@ def rapidtide_main(argparsingfunc):
                 outputdata = paddedoutputdata[numpadtrs:-numpadtrs]
                 normoutputdata = tide_math.stdnormalize(theprefilter.apply(fmrifreq, outputdata))
                 normunfilteredoutputdata = tide_math.stdnormalize(outputdata)
-                tide_io.writebidstsv(
-                    f"{outputname}_desc-refinedmovingregressor_timeseries",
-                    normunfilteredoutputdata,
-                    1.0 / fmritr,
-                    columns=["unfiltered_pass" + str(thepass)],
-                    extraheaderinfo={
-                        "Description": "The raw and filtered probe regressor produced by the refinement procedure, at the time resolution of the data"
-                    },
-                    append=(thepass > 1),
-                )
-                tide_io.writebidstsv(
-                    f"{outputname}_desc-refinedmovingregressor_timeseries",
-                    normoutputdata,
-                    1.0 / fmritr,
-                    columns=["filtered_pass" + str(thepass)],
-                    extraheaderinfo={
-                        "Description": "The raw and filtered probe regressor produced by the refinement procedure, at the time resolution of the data"
-                    },
-                    append=True,
+                # write both versions in one call, rather than rereading and rewriting the file
+                iofutures.append(
+                    iopool.submit(
+                        tide_io.writebidstsv,
+                        f"{outputname}_desc-refinedmovingregressor_timeseries",
+                        np.vstack((normunfilteredoutputdata, normoutputdata)),
+                        1.0 / fmritr,
+                        columns=[f"unfiltered_pass{thepass}", f"filtered_pass{thepass}"],
+                        extraheaderinfo={
+                            "Description": "The raw and filtered probe regressor produced by the refinement procedure, at the time resolution of the data"
+                        },
+                        append=(thepass > 1),
+                    )
                 )
 
                 # check for convergence
@@ -3000,27 +3084,17 @@ def rapidtide_main(argparsingfunc):
                 else:
                     stoprefining = False
 
-                if optiondict["detrendorder"] > 0:
-                    resampnonosref_y = tide_fit.detrend(
-                        tide_resample.doresample(
-                            paddedinitial_fmri_x,
-                            paddednormoutputdata,
-                            initial_fmri_x,
-                            method=optiondict["interptype"],
-                        ),
-                        order=optiondict["detrendorder"],
-                        demean=optiondict["dodemean"],
-                    )
-                    resampref_y = tide_fit.detrend(
-                        tide_resample.doresample(
-                            paddedinitial_fmri_x,
-                            paddednormoutputdata,
-                            os_fmri_x,
-                            method=optiondict["interptype"],
-                        ),
-                        order=optiondict["detrendorder"],
-                        demean=optiondict["dodemean"],
-                    )
+                # reinitialize genlagtc for resampling.  genlagtc always uses univariate
+                # interpolation, so with the default interptype it also generates the new reference
+                # regressors, and the hires interpolant is only built once.
+                genlagtc = tide_resample.FastResampler(
+                    paddedinitial_fmri_x,
+                    paddednormoutputdata,
+                    padtime=optiondict["fastresamplerpadtime"],
+                )
+                if optiondict["interptype"] == "univariate":
+                    resampnonosref_y = genlagtc.yfromx(initial_fmri_x)
+                    resampref_y = genlagtc.yfromx(os_fmri_x)
                 else:
                     resampnonosref_y = tide_resample.doresample(
                         paddedinitial_fmri_x,
@@ -3034,6 +3108,17 @@ def rapidtide_main(argparsingfunc):
                         os_fmri_x,
                         method=optiondict["interptype"],
                     )
+                if optiondict["detrendorder"] > 0:
+                    resampnonosref_y = tide_fit.detrend(
+                        resampnonosref_y,
+                        order=optiondict["detrendorder"],
+                        demean=optiondict["dodemean"],
+                    )
+                    resampref_y = tide_fit.detrend(
+                        resampref_y,
+                        order=optiondict["detrendorder"],
+                        demean=optiondict["dodemean"],
+                    )
                 if optiondict["tincludemaskname"] is not None:
                     resampnonosref_y *= tmask_y
                     thefit, R2val = tide_fit.mlregress(tmask_y, resampnonosref_y)
@@ -3042,46 +3127,47 @@ def rapidtide_main(argparsingfunc):
                     thefit, R2val = tide_fit.mlregress(tmaskos_y, resampref_y)
                     resampref_y -= thefit[0, 1] * tmaskos_y
 
-                # reinitialize genlagtc for resampling
-                previousnormoutputdata = normoutputdata + 0.0
-                genlagtc = tide_resample.FastResampler(
-                    paddedinitial_fmri_x,
-                    paddednormoutputdata,
-                    padtime=optiondict["fastresamplerpadtime"],
+                # normoutputdata is regenerated every pass and never modified in place, so no copy
+                previousnormoutputdata = normoutputdata
+                iofutures.append(
+                    iopool.submit(genlagtc.save, f"{outputname}_desc-lagtcgenerator_timeseries")
                 )
-                genlagtc.save(f"{outputname}_desc-lagtcgenerator_timeseries")
                 if optiondict["debug"]:
                     genlagtc.info()
-                (
-                    optiondict[f"kurtosis_reference_pass{thepass + 1}"],
-                    optiondict[f"kurtosisz_reference_pass{thepass + 1}"],
-                    optiondict[f"kurtosisp_reference_pass{thepass + 1}"],
-                ) = tide_stats.kurtosisstats(resampref_y)
                 (
                     optiondict[f"skewness_reference_pass{thepass + 1}"],
                     optiondict[f"skewnessz_reference_pass{thepass + 1}"],
                     optiondict[f"skewnessp_reference_pass{thepass + 1}"],
-                ) = tide_stats.skewnessstats(resampref_y)
+                    optiondict[f"kurtosis_reference_pass{thepass + 1}"],
+                    optiondict[f"kurtosisz_reference_pass{thepass + 1}"],
+                    optiondict[f"kurtosisp_reference_pass{thepass + 1}"],
+                ) = tide_stats.skewnesskurtosisstats(resampref_y)
                 if not stoprefining:
-                    tide_io.writebidstsv(
-                        f"{outputname}_desc-movingregressor_timeseries",
-                        tide_math.stdnormalize(resampnonosref_y),
-                        1.0 / fmritr,
-                        columns=["pass" + str(thepass + 1)],
-                        extraheaderinfo={
-                            "Description": "The probe regressor used in each pass, at the time resolution of the data"
-                        },
-                        append=True,
+                    iofutures.append(
+                        iopool.submit(
+                            tide_io.writebidstsv,
+                            f"{outputname}_desc-movingregressor_timeseries",
+                            tide_math.stdnormalize(resampnonosref_y),
+                            1.0 / fmritr,
+                            columns=["pass" + str(thepass + 1)],
+                            extraheaderinfo={
+                                "Description": "The probe regressor used in each pass, at the time resolution of the data"
+                            },
+                            append=True,
+                        )
                     )
-                    tide_io.writebidstsv(
-                        f"{outputname}_desc-oversampledmovingregressor_timeseries",
-                        tide_math.stdnormalize(resampref_y),
-                        oversampfreq,
-                        columns=["pass" + str(thepass + 1)],
-                        extraheaderinfo={
-                            "Description": "The probe regressor used in each pass, at the time resolution used for calculating the similarity function"
-                        },
-                        append=True,
+                    iofutures.append(
+                        iopool.submit(
+                            tide_io.writebidstsv,
+                            f"{outputname}_desc-oversampledmovingregressor_timeseries",
+                            tide_math.stdnormalize(resampref_y),
+                            oversampfreq,
+                            columns=["pass" + str(thepass + 1)],
+                            extraheaderinfo={
+                                "Description": "The probe regressor used in each pass, at the time resolution used for calculating the similarity function"
+                            },
+                            append=True,
+                        )
                     )
             else:
                 LGR.warning(f"refinement failed - terminating at end of pass {thepass}")
@@ -3097,21 +3183,18 @@ def rapidtide_main(argparsingfunc):
             )
         if optiondict["saveintermediatemaps"]:
             if not optiondict["textio"]:
-                theheader = copy.deepcopy(nim_hdr)
-                if fileiscifti:
-                    timeindex = theheader["dim"][0] - 1
-                    spaceindex = theheader["dim"][0]
-                    theheader["dim"][timeindex] = 1
-                    theheader["dim"][spaceindex] = numspatiallocs
-                else:
-                    theheader["dim"][0] = 3
-                    theheader["dim"][4] = 1
-                    theheader["pixdim"][4] = 1.0
+                theheader = passmapheader
             bidspasssuffix = f"_intermediatedata-pass{thepass}"
             maplist = [
-                (fitmask, "corrfit", "mask", None, "Voxels where correlation value was fit"),
                 (
-                    failreason,
+                    fitmask.copy(),
+                    "corrfit",
+                    "mask",
+                    None,
+                    "Voxels where correlation value was fit",
+                ),
+                (
+                    failreason.copy(),
                     "corrfitfailreason",
                     "info",
                     None,
@@ -3130,21 +3213,36 @@ def rapidtide_main(argparsingfunc):
                 )
             if thepass < optiondict["passes"]:
                 maplist.append(
-                    (refinemask, "refinemask", "map", None, "Voxels used for regressor refinement")
+                    (
+                        refinemask.copy(),
+                        "refinemask",
+                        "map",
+                        None,
+                        "Voxels used for regressor refinement",
+                    )
+                )
+            iofutures.append(
+                iopool.submit(
+                    tide_io.savemaplist,
+                    f"{outputname}{bidspasssuffix}",
+                    maplist,
+                    validvoxels,
+                    nativespaceshape,
+                    theheader,
+                    bidsbasedict,
+                    textio=optiondict["textio"],
+                    fileiscifti=fileiscifti,
+                    rt_floattype=rt_floattype,
+                    cifti_hdr=cifti_hdr,
+                    nthreads=optiondict["nprocs"],
                 )
-            tide_io.savemaplist(
-                f"{outputname}{bidspasssuffix}",
-                maplist,
-                validvoxels,
-                nativespaceshape,
-                theheader,
-                bidsbasedict,
-                textio=optiondict["textio"],
-                fileiscifti=fileiscifti,
-                rt_floattype=rt_floattype,
-                cifti_hdr=cifti_hdr,
             )
 
+    # make sure all of the per-pass outputs are on disk (and raise any write errors)
+    for thefuture in iofutures:
+        thefuture.result()
+    iopool.shutdown()
+
     # We are done with refinement.
     if optiondict["convergencethresh"] is None:
         optiondict["actual_passes"] = optiondict["passes"]
@@ -3188,7 +3286,6 @@ def rapidtide_main(argparsingfunc):
             detrendorder=optiondict["detrendorder"],
             debug=False,
         )
-        theCoherer.setreftc(cleaned_nonosreferencetc)
         (
             coherencefreqstart,
             dummy,
@@ -3235,26 +3332,25 @@ def rapidtide_main(argparsingfunc):
             optiondict["memprofile"],
             "before coherencepass",
         )
-        disablemkl(1, debug=threaddebug)
-        voxelsprocessed_coherence = coherencepass_func(
-            fmri_data_valid,
-            theCoherer,
-            coherencefunc,
-            coherencepeakval,
-            coherencepeakfreq,
-            alt=True,
-            showprogressbar=optiondict["showprogressbar"],
-            chunksize=optiondict["mp_chunksize"],
-            nprocs=1,
-            alwaysmultiproc=optiondict["alwaysmultiproc"],
-            rt_floatset=rt_floatset,
-            rt_floattype=rt_floattype,
-        )
-        enablemkl(optiondict["mklthreads"], debug=threaddebug)
+        with mklsuspended(1, optiondict["mklthreads"], debug=threaddebug):
+            voxelsprocessed_coherence = coherencepass_func(
+                fmri_data_valid,
+                theCoherer,
+                coherencefunc,
+                coherencepeakval,
+                coherencepeakfreq,
+                alt=True,
+                showprogressbar=optiondict["showprogressbar"],
+                chunksize=optiondict["mp_chunksize"],
+                nprocs=1,
+                alwaysmultiproc=optiondict["alwaysmultiproc"],
+                rt_floatset=rt_floatset,
+                rt_floattype=rt_floattype,
+            )
 
         # save the results of the calculations
         if not optiondict["textio"]:
-            theheader = copy.deepcopy(nim_hdr)
+            theheader = nim_hdr.copy()
             theheader["toffset"] = coherencefreqstart
             theheader["pixdim"][4] = coherencefreqstep
             if fileiscifti:
@@ -3288,25 +3384,27 @@ def rapidtide_main(argparsingfunc):
             },
         )
 
+    # the fit mask is final now - get the indices of the fit voxels once for all the histograms
+    fitvoxels = np.flatnonzero(fitmask > 0)
+
     # Post refinement step 0 - Wiener deconvolution
     if optiondict["dodeconv"]:
         TimingLGR.info("Wiener deconvolution start")
         LGR.info("\n\nWiener deconvolution")
 
-        # now allocate the arrays needed for Wiener deconvolution
+        # now allocate the arrays needed for Wiener deconvolution - both outputs live in one
+        # buffer, so there is a single shared memory segment to create and release
         if optiondict["sharedmem"]:
-            wienerdeconv, wienerdeconv_shm = tide_util.allocshared(
-                internalvalidspaceshape, rt_outfloatset, name=f"wienerdeconv_{optiondict['pid']}"
-            )
-            wpeak, wpeak_shm = tide_util.allocshared(
-                internalvalidspaceshape, rt_outfloatset, name=f"wpeak_{optiondict['pid']}"
+            wienerbuf, wienerbuf_shm = tide_util.allocshared(
+                (2, internalvalidspaceshape), rt_outfloatset, name=f"wiener_{optiondict['pid']}"
             )
             ramlocation = "in shared memory"
         else:
-            wienerdeconv = np.zeros(internalvalidspaceshape, dtype=rt_outfloattype)
-            wpeak = np.zeros(internalvalidspaceshape, dtype=rt_outfloattype)
+            wienerbuf = np.zeros((2, internalvalidspaceshape), dtype=rt_outfloattype)
             ramlocation = "locally"
-        optiondict["totalwienerbytes"] = wienerdeconv.nbytes + wpeak.nbytes
+        wienerdeconv = wienerbuf[0]
+        wpeak = wienerbuf[1]
+        optiondict["totalwienerbytes"] = wienerbuf.nbytes
         thesize, theunit = tide_util.format_bytes(optiondict["totalwienerbytes"])
         print(f"allocated {thesize:.3f} {theunit} {ramlocation} for wiener deconvolution")
 
@@ -3335,9 +3433,9 @@ def rapidtide_main(argparsingfunc):
         )
         del wienerdeconv
         del wpeak
+        del wienerbuf
         if optiondict["sharedmem"]:
-            tide_util.cleanup_shm(wienerdeconv_shm)
-            tide_util.cleanup_shm(wpeak_shm)
+            tide_util.cleanup_shm(wienerbuf_shm)
 
     ####################################################
     #  GLM filtering start
@@ -3369,74 +3467,103 @@ def rapidtide_main(argparsingfunc):
             or (optiondict["glmsourcefile"] is not None)
             or optiondict["docvrmap"]
         ):
-            if optiondict["glmsourcefile"] is not None:
-                LGR.info(f"reading in {optiondict['glmsourcefile']} for GLM filter, please wait")
-                sourcename = optiondict["glmsourcefile"]
-            else:
-                LGR.info(f"rereading {fmrifilename} for GLM filter, please wait")
-                sourcename = fmrifilename
-            if fileiscifti:
-                LGR.info("input file is CIFTI")
-                (
-                    dummy,
-                    cifti_hdr,
-                    nim_data,
-                    nim_hdr,
-                    thedims,
-                    thesizes,
-                    dummy,
-                ) = tide_io.readfromcifti(sourcename)
+            if (
+                (optiondict["gausssigma"] <= 0.0)
+                and (optiondict["glmsourcefile"] is None)
+                and not (domotion or doconfounds)
+            ):
+                # the data we already have in memory is exactly what we would reread (no
+                # smoothing, no confound regression), so just use it
+                LGR.info("reusing the fmri data in memory for CVR map")
+                LGR.info("normalzing data for CVR map")
+                gatherblocksize = 1000
+                for startvox in range(0, numvalidspatiallocs, gatherblocksize):
+                    endvox = min(startvox + gatherblocksize, numvalidspatiallocs)
+                    theblock = fmri_data_valid[startvox:endvox, :]
+                    theblock /= np.mean(theblock, axis=1, keepdims=True)
             else:
-                if optiondict["textio"]:
-                    nim_data = tide_io.readvecs(sourcename)
+                if optiondict["glmsourcefile"] is not None:
+                    LGR.info(
+                        f"reading in {optiondict['glmsourcefile']} for GLM filter, please wait"
+                    )
+                    sourcename = optiondict["glmsourcefile"]
                 else:
-                    nim, nim_data, nim_hdr, thedims, thesizes = tide_io.readfromnifti(sourcename)
-
-            fmri_data_valid = (
-                nim_data.reshape((numspatiallocs, timepoints))[:, validstart : validend + 1]
-            )[validvoxels, :] + 0.0
+                    LGR.info(f"rereading {fmrifilename} for GLM filter, please wait")
+                    sourcename = fmrifilename
+                if fileiscifti:
+                    LGR.info("input file is CIFTI")
+                    (
+                        dummy,
+                        cifti_hdr,
+                        nim_data,
+                        nim_hdr,
+                        thedims,
+                        thesizes,
+                        dummy,
+                    ) = tide_io.readfromcifti(sourcename)
+                else:
+                    if optiondict["textio"]:
+                        nim_data = tide_io.readvecs(sourcename)
+                    else:
+                        nim, nim_data, nim_hdr, thedims, thesizes = tide_io.readfromnifti(
+                            sourcename
+                        )
 
-            if optiondict["docvrmap"]:
-                # percent normalize the fmri data
-                LGR.info("normalzing data for CVR map")
-                themean = np.mean(fmri_data_valid, axis=1)
-                fmri_data_valid /= themean[:, None]
+                # gather the valid voxels in blocks straight into their final home (shared memory if
+                # we are using it) so we never hold more than one extra copy of the data
+                if optiondict["sharedmem"]:
+                    tide_util.cleanup_shm(fmri_data_valid_shm)
+                    LGR.info("moving fmri data to shared memory")
+                    TimingLGR.info("Start moving fmri_data to shared memory")
+                    fmri_data_valid, fmri_data_valid_shm = tide_util.allocshared(
+                        (numvalidspatiallocs, validend - validstart + 1),
+                        rt_floatset,
+                        name=f"fmri_data_valid_glm_{optiondict['pid']}",
+                    )
+                else:
+                    fmri_data_valid = np.empty(
+                        (numvalidspatiallocs, validend - validstart + 1), dtype=nim_data.dtype
+                    )
+                sourcedata = nim_data.reshape((numspatiallocs, timepoints))[
+                    :, validstart : validend + 1
+                ]
+                if optiondict["docvrmap"]:
+                    LGR.info("normalzing data for CVR map")
+                gatherblocksize = 1000
+                for startvox in range(0, numvalidspatiallocs, gatherblocksize):
+                    endvox = min(startvox + gatherblocksize, numvalidspatiallocs)
+                    theblock = fmri_data_valid[startvox:endvox, :]
+                    theblock[:, :] = sourcedata[validvoxels[startvox:endvox], :]
+                    if optiondict["docvrmap"]:
+                        # percent normalize the fmri data while this block is still in cache
+                        theblock /= np.mean(theblock, axis=1, keepdims=True)
+                del sourcedata
+                del nim_data
+                if optiondict["sharedmem"]:
+                    TimingLGR.info("End moving fmri_data to shared memory")
 
             if optiondict["preservefiltering"]:
                 LGR.info("reapplying temporal filters...")
                 LGR.info(f"fmri_data_valid.shape: {fmri_data_valid.shape}")
-                for i in range(len(validvoxels)):
-                    filteredtc = theprefilter.apply(
-                        optiondict["fmrifreq"], fmri_data_valid[i, :] + 0.0
-                    )
-                    fmri_data_valid[i, :] = filteredtc + 0.0
-                LGR.info("...done")
-
-            # move fmri_data_valid into shared memory
-            if optiondict["sharedmem"]:
-                tide_util.cleanup_shm(fmri_data_valid_shm)
-                LGR.info("moving fmri data to shared memory")
-                TimingLGR.info("Start moving fmri_data to shared memory")
-                numpy2shared_func = addmemprofiling(
-                    tide_util.numpy2shared,
-                    optiondict["memprofile"],
-                    "before movetoshared (glm)",
-                )
-                fmri_data_valid, fmri_data_valid_shm = numpy2shared_func(
-                    fmri_data_valid, rt_floatset, name=f"fmri_data_valid_glm_{optiondict['pid']}"
+                theprefilter.applybatch(
+                    optiondict["fmrifreq"],
+                    fmri_data_valid,
+                    out=fmri_data_valid,
+                    nthreads=optiondict["nprocs"],
                 )
-                TimingLGR.info("End moving fmri_data to shared memory")
-            del nim_data
+                LGR.info("...done")
 
         # now allocate the arrays needed for GLM filtering
         if optiondict["refinedelay"]:
-            derivaxissize = np.max([2, optiondict["glmderivs"] + 1])
+            derivaxissize = max(2, optiondict["glmderivs"] + 1)
         else:
             derivaxissize = optiondict["glmderivs"] + 1
         internalvalidspaceshapederivs = (
             internalvalidspaceshape,
             derivaxissize,
         )
+        # the removed signal is only kept if we are going to write it out
+        savemovingsignal = optiondict["doglmfilt"] and optiondict["savemovingsignal"]
         if optiondict["sharedmem"]:
             glmmean, glmmean_shm = tide_util.allocshared(
                 internalvalidspaceshape, rt_outfloatset, name=f"glmmean_{optiondict['pid']}"
@@ -3453,9 +3580,14 @@ def rapidtide_main(argparsingfunc):
             fitcoeff, fitcoeff_shm = tide_util.allocshared(
                 internalvalidspaceshapederivs, rt_outfloatset, name=f"fitcoeff_{optiondict['pid']}"
             )
-            movingsignal, movingsignal_shm = tide_util.allocshared(
-                internalvalidfmrishape, rt_outfloatset, name=f"movingsignal_{optiondict['pid']}"
-            )
+            if savemovingsignal:
+                movingsignal, movingsignal_shm = tide_util.allocshared(
+                    internalvalidfmrishape,
+                    rt_outfloatset,
+                    name=f"movingsignal_{optiondict['pid']}",
+                )
+            else:
+                movingsignal, movingsignal_shm = None, None
             lagtc, lagtc_shm = tide_util.allocshared(
                 internalvalidfmrishape, rt_floatset, name=f"lagtc_{optiondict['pid']}"
             )
@@ -3469,7 +3601,10 @@ def rapidtide_main(argparsingfunc):
             r2value = np.zeros(internalvalidspaceshape, dtype=rt_outfloattype)
             fitNorm = np.zeros(internalvalidspaceshapederivs, dtype=rt_outfloattype)
             fitcoeff = np.zeros(internalvalidspaceshapederivs, dtype=rt_outfloattype)
-            movingsignal = np.zeros(internalvalidfmrishape, dtype=rt_outfloattype)
+            if savemovingsignal:
+                movingsignal = np.zeros(internalvalidfmrishape, dtype=rt_outfloattype)
+            else:
+                movingsignal = None
             lagtc = np.zeros(internalvalidfmrishape, dtype=rt_floattype)
             filtereddata = np.zeros(internalvalidfmrishape, dtype=rt_outfloattype)
             ramlocation = "locally"
@@ -3480,10 +3615,11 @@ def rapidtide_main(argparsingfunc):
             + r2value.nbytes
             + fitNorm.nbytes
             + fitcoeff.nbytes
-            + movingsignal.nbytes
             + lagtc.nbytes
             + filtereddata.nbytes
         )
+        if movingsignal is not None:
+            optiondict["totalglmbytes"] += movingsignal.nbytes
         thesize, theunit = tide_util.format_bytes(optiondict["totalglmbytes"])
         print(f"allocated {thesize:.3f} {theunit} {ramlocation} for glm/delay refinement")
 
@@ -3504,14 +3640,14 @@ def rapidtide_main(argparsingfunc):
         if optiondict["debug"]:
             # dump the fmri input file going to glm
             if not optiondict["textio"]:
-                theheader = copy.deepcopy(nim_hdr)
+                theheader = nim_hdr.copy()
                 if fileiscifti:
                     timeindex = theheader["dim"][0] - 1
                     spaceindex = theheader["dim"][0]
-                    theheader["dim"][timeindex] = np.shape(outfmriarray)[1]
+                    theheader["dim"][timeindex] = internalfmrishape[1]
                     theheader["dim"][spaceindex] = numspatiallocs
                 else:
-                    theheader["dim"][4] = np.shape(outfmriarray)[1]
+                    theheader["dim"][4] = internalfmrishape[1]
                     theheader["pixdim"][4] = fmritr
             else:
                 theheader = None
@@ -3600,15 +3736,15 @@ def rapidtide_main(argparsingfunc):
             )
 
             # now calculate the delay offsets
-            delayoffset = filteredglmderivratios * 0.0
             if optiondict["focaldebug"]:
                 print(f"calculating delayoffsets for {filteredglmderivratios.shape[0]} voxels")
-            for i in range(filteredglmderivratios.shape[0]):
-                delayoffset[i] = tide_refinedelay.ratiotodelay(filteredglmderivratios[i])
+            delayoffset = tide_refinedelay.ratiotodelay(filteredglmderivratios).astype(
+                filteredglmderivratios.dtype, copy=False
+            )
             namesuffix = "_desc-delayoffset_hist"
             if optiondict["doglmfilt"]:
                 tide_stats.makeandsavehistogram(
-                    delayoffset[np.where(fitmask > 0)],
+                    delayoffset[fitvoxels],
                     optiondict["histlen"],
                     1,
                     outputname + namesuffix,
@@ -3690,9 +3826,12 @@ def rapidtide_main(argparsingfunc):
             # finalrawvariance = tide_math.imagevariance(filtereddata, None, 1.0 / fmritr)
             finalvariance = tide_math.imagevariance(filtereddata, theprefilter, 1.0 / fmritr)
 
-            divlocs = np.where(finalvariance > 0.0)
-            varchange = initialvariance * 0.0
-            varchange[divlocs] = 100.0 * (finalvariance[divlocs] / initialvariance[divlocs] - 1.0)
+            # voxels with no initial variance are left at 0 rather than becoming inf
+            divmask = (finalvariance > 0.0) & (initialvariance != 0.0)
+            varchange = np.zeros_like(initialvariance)
+            np.divide(finalvariance, initialvariance, out=varchange, where=divmask)
+            np.subtract(varchange, 1.0, out=varchange, where=divmask)
+            varchange *= 100.0
 
             """divlocs = np.where(finalrawvariance > 0.0)
             rawvarchange = initialrawvariance * 0.0
@@ -3704,6 +3843,16 @@ def rapidtide_main(argparsingfunc):
             if optiondict["sharedmem"]:
                 tide_util.cleanup_shm(fmri_data_valid_shm)
 
+            # let go of the voxelwise timecourses that won't be written out.  With no derivatives,
+            # regressorset is lagtc itself, so lagtc stays around if the regressors are saved.
+            # Shared memory segments stay mapped until the final cleanup, since closing one
+            # while any view of it is alive is not safe.
+            lagtc = None
+            if not optiondict["saveallglmfiles"]:
+                regressorset = None
+            if not (optiondict["doglmfilt"] and optiondict["saveminimumglmfiles"]):
+                filtereddata = None
+
             LGR.info("End filtering operation")
             TimingLGR.info(
                 "GLM filtering end",
@@ -3724,7 +3873,7 @@ def rapidtide_main(argparsingfunc):
     TimingLGR.info("Start saving histograms")
     namesuffix = "_desc-maxtime_hist"
     tide_stats.makeandsavehistogram(
-        lagtimes[np.where(fitmask > 0)],
+        lagtimes[fitvoxels],
         optiondict["histlen"],
         0,
         outputname + namesuffix,
@@ -3735,7 +3884,7 @@ def rapidtide_main(argparsingfunc):
     )
     namesuffix = "_desc-maxcorr_hist"
     tide_stats.makeandsavehistogram(
-        lagstrengths[np.where(fitmask > 0)],
+        lagstrengths[fitvoxels],
         optiondict["histlen"],
         0,
         outputname + namesuffix,
@@ -3746,7 +3895,7 @@ def rapidtide_main(argparsingfunc):
     )
     namesuffix = "_desc-maxwidth_hist"
     tide_stats.makeandsavehistogram(
-        lagsigma[np.where(fitmask > 0)],
+        lagsigma[fitvoxels],
         optiondict["histlen"],
         1,
         outputname + namesuffix,
@@ -3757,7 +3906,7 @@ def rapidtide_main(argparsingfunc):
     namesuffix = "_desc-lfofilterR2_hist"
     if optiondict["doglmfilt"]:
         tide_stats.makeandsavehistogram(
-            r2value[np.where(fitmask > 0)],
+            r2value[fitvoxels],
             optiondict["histlen"],
             1,
             outputname + namesuffix,
@@ -3768,7 +3917,7 @@ def rapidtide_main(argparsingfunc):
     namesuffix = "_desc-lfofilterInbandVarianceChange_hist"
     if optiondict["doglmfilt"]:
         tide_stats.makeandsavehistogram(
-            varchange[np.where(fitmask > 0)],
+            varchange[fitvoxels],
             optiondict["histlen"],
             1,
             outputname + namesuffix,
@@ -3781,32 +3930,32 @@ def rapidtide_main(argparsingfunc):
 
     # put some quality metrics into the info structure
     histpcts = [0.02, 0.25, 0.5, 0.75, 0.98]
-    thetimepcts = tide_stats.getfracvals(lagtimes[np.where(fitmask > 0)], histpcts, nozero=False)
-    thestrengthpcts = tide_stats.getfracvals(
-        lagstrengths[np.where(fitmask > 0)], histpcts, nozero=False
-    )
-    thesigmapcts = tide_stats.getfracvals(lagsigma[np.where(fitmask > 0)], histpcts, nozero=False)
-    for i in range(len(histpcts)):
-        optiondict[f"lagtimes_{str(int(np.round(100 * histpcts[i], 0))).zfill(2)}pct"] = (
-            thetimepcts[i]
-        )
-        optiondict[f"lagstrengths_{str(int(np.round(100 * histpcts[i], 0))).zfill(2)}pct"] = (
-            thestrengthpcts[i]
-        )
-        optiondict[f"lagsigma_{str(int(np.round(100 * histpcts[i], 0))).zfill(2)}pct"] = (
-            thesigmapcts[i]
-        )
-    optiondict["fitmasksize"] = np.sum(fitmask)
+    thetimepcts = tide_stats.getfracvals(lagtimes[fitvoxels], histpcts, nozero=False)
+    thestrengthpcts = tide_stats.getfracvals(lagstrengths[fitvoxels], histpcts, nozero=False)
+    thesigmapcts = tide_stats.getfracvals(lagsigma[fitvoxels], histpcts, nozero=False)
+    pctkeys = [f"{int(round(100 * thepct)):02d}pct" for thepct in histpcts]
+    for i, thekey in enumerate(pctkeys):
+        optiondict[f"lagtimes_{thekey}"] = thetimepcts[i]
+        optiondict[f"lagstrengths_{thekey}"] = thestrengthpcts[i]
+        optiondict[f"lagsigma_{thekey}"] = thesigmapcts[i]
+    optiondict["fitmasksize"] = np.shape(fitvoxels)[0]
     optiondict["fitmaskpct"] = 100.0 * optiondict["fitmasksize"] / optiondict["corrmasksize"]
 
     # Post refinement step 3 - save out all the important arrays to nifti files
     # write out the options used
     tide_io.writedicttojson(optiondict, f"{outputname}_desc-runoptions_info.json")
 
-    # write the 3D maps that need to be remapped
+    # write the 3D maps that need to be remapped.  All the 3D maps are gathered into savelist and
+    # written with a single savemaplist call, so the per-call setup is only done once.
     TimingLGR.info("Start saving maps")
+    # the map lists are written in the background (mostly gzip, which releases the GIL) while
+    # the next list is put together.  Every submission gets its own copy of the header.
+    savepool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, min(4, optiondict["nprocs"]))
+    )
+    savefutures = []
     if not optiondict["textio"]:
-        theheader = copy.deepcopy(nim_hdr)
+        theheader = nim_hdr.copy()
         if fileiscifti:
             timeindex = theheader["dim"][0] - 1
             spaceindex = theheader["dim"][0]
@@ -3820,6 +3969,11 @@ def rapidtide_main(argparsingfunc):
         theheader = None
         cifti_hdr = None
 
+    # make a rank order map, scaled in place so the float copy of the ranks is the only temporary
+    timepercentile = denserank(lagtimes).astype(np.float64)
+    timepercentile *= 100.0
+    timepercentile /= numvalidspatiallocs - 1
+
     savelist = [
         (lagtimes, "maxtime", "map", "second", "Lag time in seconds"),
         (
@@ -3841,9 +3995,10 @@ def rapidtide_main(argparsingfunc):
         (fitmask, "corrfit", "mask", None, "Voxels where correlation value was fit"),
         (failreason, "corrfitfailreason", "info", None, "Result codes for correlation fit"),
     ]
-    MTT = np.square(lagsigma) - (optiondict["acwidth"] * optiondict["acwidth"])
-    MTT = np.where(MTT > 0.0, MTT, 0.0)
-    MTT = np.sqrt(MTT)
+    MTT = np.square(lagsigma)
+    MTT -= optiondict["acwidth"] * optiondict["acwidth"]
+    np.fmax(MTT, 0.0, out=MTT)
+    np.sqrt(MTT, out=MTT)
     savelist += [(MTT, "MTT", "map", "second", "Mean transit time (estimated)")]
     if optiondict["refinedelay"]:
         savelist += [
@@ -3892,21 +4047,9 @@ def rapidtide_main(argparsingfunc):
             (coherencepeakval, "coherencepeakval", "map", None, "Coherence peak value"),
             (coherencepeakfreq, "coherencepeakfreq", "map", None, "Coherence peak frequency"),
         ]
-    tide_io.savemaplist(
-        outputname,
-        savelist,
-        validvoxels,
-        nativespaceshape,
-        theheader,
-        bidsbasedict,
-        textio=optiondict["textio"],
-        fileiscifti=fileiscifti,
-        rt_floattype=rt_floattype,
-        cifti_hdr=cifti_hdr,
-    )
     namesuffix = "_desc-MTT_hist"
     tide_stats.makeandsavehistogram(
-        MTT[np.where(fitmask > 0)],
+        MTT[fitvoxels],
         optiondict["histlen"],
         1,
         outputname + namesuffix,
@@ -4052,18 +4195,7 @@ def rapidtide_main(argparsingfunc):
                     ),
                 ]
 
-        tide_io.savemaplist(
-            outputname,
-            maplist,
-            validvoxels,
-            nativespaceshape,
-            theheader,
-            bidsbasedict,
-            textio=optiondict["textio"],
-            fileiscifti=fileiscifti,
-            rt_floattype=rt_floattype,
-            cifti_hdr=cifti_hdr,
-        )
+        savelist += maplist
         del glmmean
         del rvalue
         del r2value
@@ -4079,42 +4211,34 @@ def rapidtide_main(argparsingfunc):
             tide_util.cleanup_shm(fitcoeff_shm)
             tide_util.cleanup_shm(fitNorm_shm)
 
-    # write the 3D maps that don't need to be remapped
-    maplist = [
-        (meanvalue, "mean", "map", None, "Voxelwise mean of fmri data"),
-        (stddevvalue, "std", "map", None, "Voxelwise standard deviation of fmri data"),
-        (covvalue, "CoV", "map", None, "Voxelwise coefficient of variation of fmri data"),
+    # add the 3D maps that don't need to be remapped (the trailing None overrides validvoxels)
+    savelist += [
+        (meanvalue, "mean", "map", None, "Voxelwise mean of fmri data", None),
+        (stddevvalue, "std", "map", None, "Voxelwise standard deviation of fmri data", None),
+        (covvalue, "CoV", "map", None, "Voxelwise coefficient of variation of fmri data", None),
     ]
     if brainmask is not None:
-        maplist.append((brainmask, "brainmask", "mask", None, "Brain mask"))
+        savelist.append((brainmask, "brainmask", "mask", None, "Brain mask", None))
     if graymask is not None:
-        maplist.append((graymask, "GM", "mask", None, "Gray matter mask"))
+        savelist.append((graymask, "GM", "mask", None, "Gray matter mask", None))
     if whitemask is not None:
-        maplist.append((whitemask, "WM", "mask", None, "White matter mask"))
-    tide_io.savemaplist(
-        outputname,
-        maplist,
-        None,
-        nativespaceshape,
-        theheader,
-        bidsbasedict,
-        textio=optiondict["textio"],
-        fileiscifti=fileiscifti,
-        rt_floattype=rt_floattype,
-        cifti_hdr=cifti_hdr,
-    )
+        savelist.append((whitemask, "WM", "mask", None, "White matter mask", None))
     del meanvalue
 
     if optiondict["numestreps"] > 0:
+        # make all the significance masks at once - row i is the mask for thepercentiles[i]
+        if optiondict["dosighistfit"]:
+            thethresholds = np.asarray(pcts_fit)
+        else:
+            thethresholds = np.asarray(pcts)
+        # fitmask is 0/1, so the masks can be kept as booleans rather than multiplied out
+        pmasks = np.abs(lagstrengths)[None, :] > thethresholds[:, None]
+        pmasks &= (fitmask > 0)[None, :]
         masklist = []
         for i in range(0, len(thepercentiles)):
-            if optiondict["dosighistfit"]:
-                pmask = np.where(np.abs(lagstrengths) > pcts_fit[i], fitmask, 0 * fitmask)
-            else:
-                pmask = np.where(np.abs(lagstrengths) > pcts[i], fitmask, 0 * fitmask)
             masklist += [
                 (
-                    pmask.copy(),
+                    pmasks[i],
                     f"plt{thepvalnames[i]}",
                     "mask",
                     None,
@@ -4122,19 +4246,9 @@ def rapidtide_main(argparsingfunc):
                 )
             ]
 
-        tide_io.savemaplist(
-            outputname,
-            masklist,
-            validvoxels,
-            nativespaceshape,
-            theheader,
-            bidsbasedict,
-            textio=optiondict["textio"],
-            fileiscifti=fileiscifti,
-            rt_floattype=rt_floattype,
-            cifti_hdr=cifti_hdr,
-        )
+        savelist += masklist
         del masklist
+        del pmasks
 
     if (optiondict["passes"] > 1 or optiondict["globalpreselect"]) and optiondict[
         "refinestopreason"
@@ -4151,20 +4265,27 @@ def rapidtide_main(argparsingfunc):
             ]
         else:
             masklist = [(refinemask, "refine", "mask", None, "Voxels used for refinement")]
-        tide_io.savemaplist(
-            outputname,
-            masklist,
-            validvoxels,
-            nativespaceshape,
-            theheader,
-            bidsbasedict,
-            textio=optiondict["textio"],
-            fileiscifti=fileiscifti,
-            rt_floattype=rt_floattype,
-            cifti_hdr=cifti_hdr,
-        )
+        savelist += masklist
         del refinemask
 
+    # write all the 3D maps at once
+    mapsavefuture = savepool.submit(
+        tide_io.savemaplist,
+        outputname,
+        savelist,
+        validvoxels,
+        nativespaceshape,
+        copyheader(theheader),
+        bidsbasedict,
+        textio=optiondict["textio"],
+        fileiscifti=fileiscifti,
+        rt_floattype=rt_floattype,
+        cifti_hdr=cifti_hdr,
+        nthreads=optiondict["nprocs"],
+    )
+    savefutures.append(mapsavefuture)
+    del savelist
+
     # clean up arrays that will no longer be needed
     del lagtimes
     del lagstrengths
@@ -4174,7 +4295,7 @@ def rapidtide_main(argparsingfunc):
 
     # now do the 4D maps of the similarity function and friends
     if not optiondict["textio"]:
-        theheader = copy.deepcopy(nim_hdr)
+        theheader = nim_hdr.copy()
         theheader["toffset"] = corrscale[corrorigin - lagmininpts]
         if fileiscifti:
             timeindex = theheader["dim"][0] - 1
@@ -4188,6 +4309,7 @@ def rapidtide_main(argparsingfunc):
         theheader = None
         cifti_hdr = None
 
+    corrsavefuture = None
     if (
         optiondict["savecorrout"]
         or (optiondict["outputlevel"] != "min")
@@ -4207,38 +4329,52 @@ def rapidtide_main(argparsingfunc):
                     "The search window for the correlation peak fit",
                 ),
             ]
-        tide_io.savemaplist(
+        corrsavefuture = savepool.submit(
+            tide_io.savemaplist,
             outputname,
             maplist,
             validvoxels,
             nativecorrshape,
-            theheader,
+            copyheader(theheader),
             bidsbasedict,
             textio=optiondict["textio"],
             fileiscifti=fileiscifti,
             rt_floattype=rt_floattype,
             cifti_hdr=cifti_hdr,
+            compresslevel=optiondict["compresslevel"],
         )
+        savefutures.append(corrsavefuture)
+        del maplist
     del windowout
     del gaussout
     del corrout
     del outcorrarray
-    if optiondict["sharedmem"]:
+    if optiondict["sharedcorrarrays"]:
         tide_util.cleanup_shm(windowout_shm)
         tide_util.cleanup_shm(gaussout_shm)
         tide_util.cleanup_shm(corrout_shm)
         tide_util.cleanup_shm(outcorrarray_shm)
 
+    # the correlation arrays are only released once they are written, so wait for that before
+    # putting together the fmri sized maps - that way only one set of 4D arrays is alive at a time
+    if corrsavefuture is not None:
+        corrsavefuture.result()
+    uncollected = gc.collect()
+    if uncollected != 0:
+        LGR.info(f"garbage collected - unable to collect {uncollected} objects")
+    else:
+        LGR.info("garbage collected")
+
     # now save all the files that are of the same length as the input data file and masked
     if not optiondict["textio"]:
-        theheader = copy.deepcopy(nim_hdr)
+        theheader = nim_hdr.copy()
         if fileiscifti:
             timeindex = theheader["dim"][0] - 1
             spaceindex = theheader["dim"][0]
-            theheader["dim"][timeindex] = np.shape(outfmriarray)[1]
+            theheader["dim"][timeindex] = internalfmrishape[1]
             theheader["dim"][spaceindex] = numspatiallocs
         else:
-            theheader["dim"][4] = np.shape(outfmriarray)[1]
+            theheader["dim"][4] = internalfmrishape[1]
             theheader["pixdim"][4] = fmritr
     else:
         theheader = None
@@ -4308,6 +4444,7 @@ def rapidtide_main(argparsingfunc):
             # save a pseudofile if we're going to
             if optiondict["makepseudofile"]:
                 print("reading mean image")
+                mapsavefuture.result()
                 meanfile = f"{outputname}_desc-mean_map.nii.gz"
                 (
                     mean_input,
@@ -4328,17 +4465,21 @@ def rapidtide_main(argparsingfunc):
 
     # save maps in the current output list
     if len(maplist) > 0:
-        tide_io.savemaplist(
-            outputname,
-            maplist,
-            validvoxels,
-            nativefmrishape,
-            theheader,
-            bidsbasedict,
-            textio=optiondict["textio"],
-            fileiscifti=fileiscifti,
-            rt_floattype=rt_floattype,
-            cifti_hdr=cifti_hdr,
+        savefutures.append(
+            savepool.submit(
+                tide_io.savemaplist,
+                outputname,
+                maplist,
+                validvoxels,
+                nativefmrishape,
+                copyheader(theheader),
+                bidsbasedict,
+                textio=optiondict["textio"],
+                fileiscifti=fileiscifti,
+                rt_floattype=rt_floattype,
+                cifti_hdr=cifti_hdr,
+                compresslevel=optiondict["compresslevel"],
+            )
         )
 
     # clean up
@@ -4361,6 +4502,11 @@ def rapidtide_main(argparsingfunc):
             tide_util.cleanup_shm(filtereddata_shm)
             tide_util.cleanup_shm(movingsignal_shm)
 
+    # make sure everything is on disk (and raise any write errors)
+    for thefuture in savefutures:
+        thefuture.result()
+    savepool.shutdown()
+
     TimingLGR.info("Finished saving maps")
     LGR.info("done")
 
@@ -1309,6 +1309,20 @@ def _get_parser():
         help=("Calculate and save the coherence between the final regressor and the data."),
         default=False,
     )
+    output.add_argument(
+        "--compresslevel",
+        dest="compresslevel",
+        action="store",
+        type=int,
+        choices=range(10),
+        metavar="LEVEL",
+        help=(
+            "Gzip compression level (0-9) for the large 4D output files.  0 writes the data "
+            "uncompressed inside the .nii.gz file, which is much faster but makes larger files.  "
+            "Default is the nibabel default (1)."
+        ),
+        default=None,
+    )
 
     # Add version options
     pf.addversionopts(parser)
@@ -1640,6 +1654,16 @@ def _get_parser():
         help=("Perform patch shift correction."),
         default=False,
     )
+    experimental.add_argument(
+        "--usegpu",
+        dest="usegpu",
+        action="store_true",
+        help=(
+            "Calculate the crosscorrelations on the GPU (requires CuPy).  Falls back to the CPU if CuPy "
+            "is not installed, or if linear (zero padded) correlation is selected."
+        ),
+        default=False,
+    )
 
     # Debugging options
     debugging = parser.add_argument_group(
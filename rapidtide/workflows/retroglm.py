@@ -316,23 +316,19 @@ def retroglm(args):
         rt_outfloatset = np.float32
     therunoptions["saveminimumglmfiles"] = args.saveminimumglmfiles
 
-    # read the fmri input files
-    print("reading fmrifile")
-    fmri_input, fmri_data, fmri_header, fmri_dims, fmri_sizes = tide_io.readfromnifti(
-        args.fmrifile
+    # read the fmri input file header - the data itself is only read once we know which voxels
+    # we need
+    print("reading fmrifile header")
+    fmri_input, dummy, fmri_header, fmri_dims, fmri_sizes = tide_io.readfromnifti(
+        args.fmrifile, headeronly=True
     )
 
     # create the canary file
     Path(f"{outputname}_RETROISRUNNING.txt").touch()
 
-    if args.debug:
-        print(f"{fmri_data.shape=}")
     xdim, ydim, slicedim, fmritr = tide_io.parseniftisizes(fmri_sizes)
     xsize, ysize, numslices, timepoints = tide_io.parseniftidims(fmri_dims)
     numspatiallocs = int(xsize) * int(ysize) * int(numslices)
-    fmri_data_spacebytime = fmri_data.reshape((numspatiallocs, timepoints))
-    if args.debug:
-        print(f"{fmri_data_spacebytime.shape=}")
 
     # read the processed mask
     print("reading procfit maskfile")
@@ -343,9 +339,12 @@ def retroglm(args):
         procmask_header,
         procmask_dims,
         procmask_sizes,
-    ) = tide_io.readfromnifti(procmaskfile)
+    ) = tide_io.readfromnifti(procmaskfile, headeronly=True)
     if not tide_io.checkspacematch(fmri_header, procmask_header):
         raise ValueError("procmask dimensions do not match fmri dimensions")
+    # the masks and lag times are only compared and indexed, so they are read in their stored
+    # datatype rather than being converted to float64
+    procmask = np.asarray(procmask_input.dataobj)
     procmask_spacebytime = procmask.reshape((numspatiallocs))
     if args.debug or args.focaldebug:
         print(f"{procmask_spacebytime.shape=}")
@@ -360,9 +359,10 @@ def retroglm(args):
         corrmask_header,
         corrmask_dims,
         corrmask_sizes,
-    ) = tide_io.readfromnifti(corrmaskfile)
+    ) = tide_io.readfromnifti(corrmaskfile, headeronly=True)
     if not tide_io.checkspacematch(fmri_header, corrmask_header):
         raise ValueError("corrmask dimensions do not match fmri dimensions")
+    corrmask = np.asarray(corrmask_input.dataobj)
     corrmask_spacebytime = corrmask.reshape((numspatiallocs))
     if args.debug or args.focaldebug:
         print(f"{corrmask_spacebytime.shape=}")
@@ -376,9 +376,10 @@ def retroglm(args):
         lagtimes_header,
         lagtimes_dims,
         lagtimes_sizes,
-    ) = tide_io.readfromnifti(lagtimesfile)
+    ) = tide_io.readfromnifti(lagtimesfile, headeronly=True)
     if not tide_io.checkspacematch(fmri_header, lagtimes_header):
         raise ValueError("lagtimes dimensions do not match fmri dimensions")
+    lagtimes = np.asarray(lagtimes_input.dataobj)
     if args.debug:
         print(f"{lagtimes.shape=}")
     lagtimes_spacebytime = lagtimes.reshape((numspatiallocs))
@@ -442,15 +443,38 @@ def retroglm(args):
         print(f"validvoxels shape = {numvalidspatiallocs}")
         print(f"internalvalidfmrishape shape = {internalvalidfmrishape}")
 
-    # slicing to valid voxels
+    # read the fmri data and pull out the valid voxels.  The data is read through the proxy in
+    # its stored datatype, so the image never caches a float64 copy of the whole dataset, and the
+    # valid voxels are indexed directly in 4D rather than through a reshaped copy.  The valid
+    # voxels are kept at the internal precision of the original run, like rapidtide does.
+    print("reading fmrifile")
+    fmri_data = np.asarray(fmri_input.dataobj)
+    if args.debug:
+        print(f"{fmri_data.shape=}")
     print("selecting valid voxels")
-    fmri_data_valid = fmri_data_spacebytime[validvoxels, :]
+    fmri_data_valid = np.asarray(
+        fmri_data[np.unravel_index(validvoxels, (int(xsize), int(ysize), int(numslices)))],
+        dtype=rt_floatset,
+    )
+    del fmri_data
     lagtimes_valid = lagtimes_spacebytime[validvoxels]
     corrmask_valid = corrmask_spacebytime[validvoxels]
     procmask_valid = procmask_spacebytime[validvoxels]
     if args.debug:
         print(f"{fmri_data_valid.shape=}")
 
+    # nothing past here needs the full volumes, or the images, which hold cached copies of them
+    del fmri_input
+    del procmask_input
+    del procmask
+    del procmask_spacebytime
+    del corrmask_input
+    del corrmask
+    del corrmask_spacebytime
+    del lagtimes_input
+    del lagtimes
+    del lagtimes_spacebytime
+
     if usesharedmem:
         if args.debug:
             print("allocating shared memory")
@@ -620,11 +644,11 @@ def retroglm(args):
 
         # now calculate the delay offsets
         TimingLGR.info("Calculating delay offsets")
-        delayoffset = filteredglmderivratios * 0.0
         if args.focaldebug:
             print(f"calculating delayoffsets for {filteredglmderivratios.shape[0]} voxels")
-        for i in range(filteredglmderivratios.shape[0]):
-            delayoffset[i] = tide_refinedelay.ratiotodelay(filteredglmderivratios[i])
+        delayoffset = tide_refinedelay.ratiotodelay(filteredglmderivratios).astype(
+            filteredglmderivratios.dtype, copy=False
+        )
         namesuffix = "_desc-delayoffset_hist"
 
         tide_stats.makeandsavehistogram(
@@ -697,9 +721,12 @@ def retroglm(args):
     # finalrawvariance = tide_math.imagevariance(filtereddata, None, 1.0 / fmritr)
     finalvariance = tide_math.imagevariance(filtereddata, theprefilter, 1.0 / fmritr)
 
-    divlocs = np.where(finalvariance > 0.0)
-    varchange = initialvariance * 0.0
-    varchange[divlocs] = 100.0 * (finalvariance[divlocs] / initialvariance[divlocs] - 1.0)
+    # voxels with no initial variance are left at 0 rather than becoming inf
+    divmask = (finalvariance > 0.0) & (initialvariance != 0.0)
+    varchange = np.zeros_like(initialvariance)
+    np.divide(finalvariance, initialvariance, out=varchange, where=divmask)
+    np.subtract(varchange, 1.0, out=varchange, where=divmask)
+    varchange *= 100.0
 
     """divlocs = np.where(finalrawvariance > 0.0)
     rawvarchange = initialrawvariance * 0.0